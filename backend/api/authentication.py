@@ -0,0 +1,97 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """
+    Соответствие токен -> (пользователь, токен) в памяти процесса: LRU не
+    больше size записей, каждая живёт ttl секунд. Если задан backend
+    (псевдоним из CACHES), записи дублируются в общий кэш, и другие
+    процессы тоже обходятся без запроса к базе.
+
+    Сбрасывается сигналами при удалении токена (в том числе при выходе
+    через Djoser) и при сохранении пользователя: смена пароля,
+    деактивация, правка профиля. Записи в памяти других процессов живут
+    до истечения ttl, поэтому он должен быть коротким.
+    """
+
+    def __init__(self, ttl, size, backend=None):
+        self.ttl = ttl
+        self.size = size
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def shared_key(key):
+        # Сам токен в ключе общего кэша не хранится.
+        return f'token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+        if not self.backend:
+            return None
+        value = caches[self.backend].get(self.shared_key(key))
+        if value is not None:
+            self.store(key, value)
+        return value
+
+    def set(self, key, value):
+        self.store(key, value)
+        if self.backend:
+            caches[self.backend].set(self.shared_key(key), value, self.ttl)
+
+    def store(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self.lock:
+            for key in keys:
+                self.entries.pop(key, None)
+        if self.backend and keys:
+            caches[self.backend].delete_many(
+                [self.shared_key(key) for key in keys])
+
+
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    size=settings.TOKEN_CACHE_SIZE,
+    backend=settings.TOKEN_CACHE_BACKEND
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса к authtoken_token и users_user на
+    каждый запрос: проверенная пара (пользователь, токен) берётся из
+    token_cache.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            cached = super().authenticate_credentials(key)
+            token_cache.set(key, cached)
+        user, token = cached
+        # Копия, чтобы изменения request.user в одном запросе не попали
+        # в кэш и в параллельные запросы.
+        return copy.copy(user), token
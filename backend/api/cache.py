@@ -0,0 +1,54 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from rest_framework.utils.encoders import JSONEncoder
+
+RECIPES_VERSION_KEY = 'recipes:version'
+
+
+def get_version(key):
+    return cache.get_or_set(key, 1, timeout=None)
+
+
+def bump_version(key):
+    """ Увеличивает счётчик версии key (ключ мог и не существовать). """
+    if not cache.add(key, 2, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, timeout=None)
+
+
+def get_recipes_version():
+    return get_version(RECIPES_VERSION_KEY)
+
+
+def bump_recipes_version():
+    """
+    Инвалидирует все закэшированные ответы по рецептам сразу: версия
+    входит в ключ, поэтому старые записи просто перестают читаться и
+    истекают сами. Работает с любым бэкендом кэша.
+    """
+    bump_version(RECIPES_VERSION_KEY)
+
+
+def get_recipes_cache_key(request):
+    params = sorted(request.query_params.lists())
+    raw = json.dumps([request.get_host(), request.path, params])
+    digest = hashlib.md5(raw.encode()).hexdigest()
+    return f'recipes:{get_recipes_version()}:{digest}'
+
+
+def get_feed_cache_key(user_id):
+    return f'feed:{user_id}'
+
+
+def invalidate_feeds(user_ids):
+    """ Сбрасывает закэшированные первые страницы лент пользователей. """
+    cache.delete_many([get_feed_cache_key(user_id) for user_id in user_ids])
+
+
+def get_etag(data):
+    content = json.dumps(data, cls=JSONEncoder, sort_keys=True)
+    return f'"{hashlib.md5(content.encode()).hexdigest()}"'
@@ -0,0 +1,172 @@
+import bisect
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+
+from recipes.models import Ingredient, RecipeIngredient, Tag
+from .cache import bump_version, get_version
+
+
+class ProcessCatalog(ABC):
+    """
+    Данные в памяти процесса, согласованные между процессами общей
+    версией в кэше (version_key): invalidate() увеличивает её, и каждый
+    процесс, заметив новую версию, перечитывает данные. Версия
+    проверяется не чаще раза в check_interval секунд; ttl — страховка на
+    случай правок в обход сигналов.
+    """
+    version_key = None
+
+    def __init__(self, ttl, check_interval):
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        self.data = None
+        self.version = None
+        self.loaded_at = self.checked_at = 0
+
+    @abstractmethod
+    def build(self):
+        """ Читает данные из базы. """
+
+    def invalidate(self):
+        with self.lock:
+            self.data = None
+        bump_version(self.version_key)
+
+    def load(self):
+        with self.lock:
+            now = time.monotonic()
+            if (self.data is not None
+                    and now - self.checked_at > self.check_interval):
+                self.checked_at = now
+                if get_version(self.version_key) != self.version:
+                    self.data = None
+            if self.data is None or now - self.loaded_at > self.ttl:
+                self.version = get_version(self.version_key)
+                self.data = self.build()
+                self.loaded_at = self.checked_at = now
+            return self.data
+
+
+class IngredientCatalog(ProcessCatalog):
+    """
+    Индекс справочника ингредиентов в памяти процесса.
+
+    Хранит отсортированный по названию массив и отвечает на запросы
+    автодополнения без обращения к базе: сначала совпадения по началу
+    названия (двоичный поиск), затем по подстроке. Сбрасывается сигналами
+    при изменении Ingredient.
+    """
+    version_key = 'catalog:ingredients'
+
+    def build(self):
+        rows = Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        entries = sorted(
+            (name.upper(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        return entries, [entry[0] for entry in entries]
+
+    def search(self, term, limit):
+        entries, keys = self.load()
+        term = term.upper()
+        start = bisect.bisect_left(keys, term)
+        found = []
+        for entry in islice(entries, start, None):
+            if len(found) == limit or not entry[0].startswith(term):
+                break
+            found.append(entry)
+        if len(found) < limit:
+            for entry in entries:
+                if term in entry[0] and not entry[0].startswith(term):
+                    found.append(entry)
+                    if len(found) == limit:
+                        break
+        return [
+            Ingredient(id=pk, name=name, measurement_unit=measurement_unit)
+            for _, pk, name, measurement_unit in found
+        ]
+
+
+class TagCatalog(ProcessCatalog):
+    """
+    Соответствие slug -> id для тэгов в памяти процесса. Тэгов единицы,
+    поэтому фильтр рецептов разрешает slug без запроса к базе.
+    Сбрасывается сигналами при изменении Tag.
+    """
+    version_key = 'catalog:tags'
+
+    def build(self):
+        return dict(Tag.objects.values_list('slug', 'id'))
+
+    def get_ids(self, slugs):
+        ids = self.load()
+        return [ids[slug] for slug in slugs if slug in ids]
+
+
+class CookIndex(ProcessCatalog):
+    """
+    Обратный индекс «ингредиент -> рецепты» в памяти процесса для подбора
+    рецептов по имеющимся продуктам.
+
+    Для каждого ингредиента хранится массив id рецептов (array('I')),
+    для каждого рецепта — число строк состава, так что 100 тыс. рецептов
+    занимают несколько мегабайт. Сбрасывается сигналами после фиксации
+    изменений рецептов.
+    """
+    version_key = 'catalog:cook'
+
+    def build(self):
+        postings = {}
+        totals = Counter()
+        rows = RecipeIngredient.objects.order_by().values_list(
+            'ingredient_id', 'recipe_id').iterator(chunk_size=10000)
+        for ingredient_id, recipe_id in rows:
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array('I')
+            postings[ingredient_id].append(recipe_id)
+        for recipes in postings.values():
+            totals.update(recipes)
+        return postings, totals
+
+    def rank(self, ingredient_ids):
+        """
+        Список (recipe_id, matched, coverage) по убыванию доли
+        имеющихся ингредиентов, затем числа совпадений и новизны.
+        """
+        postings, totals = self.load()
+        matched = Counter()
+        for ingredient_id in ingredient_ids:
+            matched.update(postings.get(ingredient_id, ()))
+        # Сортировка групп с одинаковыми (совпало, всего) вместо сортировки
+        # всех кандидатов с ключом-функцией: групп не больше нескольких
+        # сотен, а id внутри группы сортируются как простые числа.
+        groups = defaultdict(list)
+        for recipe_id, count in matched.items():
+            groups[count, totals[recipe_id]].append(recipe_id)
+        ranked = []
+        for count, total in sorted(
+                groups, key=lambda key: (key[0] / key[1], key[0]),
+                reverse=True):
+            coverage = count / total
+            recipe_ids = sorted(groups[count, total], reverse=True)
+            ranked.extend(
+                (recipe_id, count, coverage) for recipe_id in recipe_ids)
+        return ranked
+
+
+ingredient_catalog = IngredientCatalog(
+    ttl=settings.INGREDIENT_SEARCH_CACHE_TTL,
+    check_interval=settings.CATALOG_VERSION_CHECK_INTERVAL)
+tag_catalog = TagCatalog(
+    ttl=settings.TAG_CATALOG_TTL,
+    check_interval=settings.CATALOG_VERSION_CHECK_INTERVAL)
+cook_index = CookIndex(
+    ttl=settings.COOK_INDEX_TTL,
+    check_interval=settings.CATALOG_VERSION_CHECK_INTERVAL)
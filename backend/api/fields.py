@@ -0,0 +1,84 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from drf_extra_fields.fields import Base64FieldMixin, Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+CHUNK_SIZE = 64 * 1024  # кратно 4, чтобы резать base64 по границе блоков
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Фотография рецепта в base64.
+
+    Размер проверяется до декодирования, а сам файл декодируется частями
+    во временный файл на диске, не создавая в памяти копию всего
+    изображения.
+    """
+    default_error_messages = {
+        'max_size': 'Размер изображения не должен превышать {max_size} МБ.',
+    }
+
+    def __init__(self, *args, **kwargs):
+        self.max_size = kwargs.pop(
+            'max_size', settings.RECIPE_IMAGE_MAX_SIZE)
+        super().__init__(*args, **kwargs)
+
+    def to_internal_value(self, base64_data):
+        if base64_data in self.EMPTY_VALUES:
+            return None
+        if not isinstance(base64_data, str):
+            return super().to_internal_value(base64_data)
+        if ';base64,' in base64_data:
+            base64_data = base64_data.split(';base64,', 1)[1]
+        # Клиенты могут переносить base64 по строкам (MIME): пробельные
+        # символы убираются до деления на блоки и строгой проверки.
+        base64_data = ''.join(base64_data.split())
+        if len(base64_data) * 3 // 4 > self.max_size:
+            self.fail('max_size', max_size=self.max_size // (1024 * 1024))
+        file = TemporaryUploadedFile(
+            self.get_file_name(None), 'application/octet-stream', 0, None)
+        try:
+            for start in range(0, len(base64_data), CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    base64_data[start:start + CHUNK_SIZE], validate=True))
+            file.size = file.tell()
+            file.seek(0)
+            extension = self.get_extension(file)
+        except serializers.ValidationError:
+            file.close()
+            raise
+        except (TypeError, binascii.Error, ValueError):
+            file.close()
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        file.name = f'{file.name}.{extension}'
+        return super(Base64FieldMixin, self).to_internal_value(file)
+
+    def get_extension(self, file):
+        try:
+            with Image.open(file) as image:
+                extension = image.format.lower()
+        except OSError:
+            raise serializers.ValidationError(self.INVALID_FILE_MESSAGE)
+        file.seek(0)
+        extension = 'jpg' if extension == 'jpeg' else extension
+        if extension not in self.ALLOWED_TYPES:
+            raise serializers.ValidationError(self.INVALID_TYPE_MESSAGE)
+        return extension
+
+
+class RenditionField(serializers.ImageField):
+    """
+    Уменьшенная копия фотографии рецепта. Пока фоновая обработка
+    не завершилась, отдаётся исходная фотография.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return super().get_attribute(instance) or instance.image
@@ -1,35 +1,94 @@
+from django.conf import settings
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
 from django_filters import rest_framework as filter
-from rest_framework.filters import SearchFilter
+from rest_framework.filters import BaseFilterBackend
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe
+from recipes.search import search_recipes
+from .catalog import ingredient_catalog, tag_catalog
 
+POPULAR_ORDERING = ('-favorites_count', '-pub_date', '-id')
 
-class IngredientFilter(SearchFilter):
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_catalog.load()]
+
+
+class IngredientFilter(BaseFilterBackend):
+    """
+    Поиск ингредиентов для автодополнения: сначала совпадения по началу
+    названия, затем по подстроке, не больше INGREDIENT_SEARCH_LIMIT.
+    """
     search_param = 'name'
 
+    def filter_queryset(self, request, queryset, view):
+        name = request.query_params.get(self.search_param, '').strip()
+        if not name or getattr(view, 'action', None) != 'list':
+            return queryset
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        if settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return ingredient_catalog.search(name, limit)
+        return queryset.filter(name__icontains=name).annotate(
+            match=Case(
+                When(name__istartswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('match', 'name')[:limit]
+
 
 class RecipeFilter(filter.FilterSet):
     author = filter.CharFilter()
-    tags = filter.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        queryset=Tag.objects.all(),
+    tags = filter.MultipleChoiceFilter(
+        choices=get_tag_choices,
         label='Tags',
-        to_field_name='slug'
+        method='get_tags'
     )
     is_favorited = filter.BooleanFilter(method='get_favorite')
     is_in_shopping_cart = filter.BooleanFilter(
         method='get_is_in_shopping_cart')
+    search = filter.CharFilter(method='get_search')
+    ordering = filter.ChoiceFilter(
+        choices=(('popular', 'popular'),),
+        method='get_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'tags', 'author', 'is_favorited', 'is_in_shopping_cart', 'search',
+            'ordering'
+        ]
+
+    def get_tags(self, queryset, name, value):
+        # EXISTS вместо JOIN: рецепт с несколькими подходящими тэгами
+        # не дублируется, и DISTINCT не нужен.
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag__in=tag_catalog.get_ids(value)
+        )))
 
     def get_favorite(self, queryset, name, value):
         if value:
-            return queryset.filter(favorite__user=self.request.user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(cart__user=self.request.user)
+            return queryset.filter(is_in_shopping_cart=True)
+        return queryset
+
+    def get_ordering(self, queryset, name, value):
+        # Популярные: по числу добавлений в избранное (recipe_popular_idx).
+        if value == 'popular':
+            return queryset.order_by(*POPULAR_ORDERING)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        value = value.strip()
+        if not value:
+            return queryset
+        return search_recipes(queryset, value).order_by(
+            '-search_rank', '-pub_date', '-id')
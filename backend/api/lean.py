@@ -0,0 +1,156 @@
+"""
+Облегчённый путь чтения для списков (LEAN_READ_PATH).
+
+Строки читаются через values()/values_list() без создания моделей и
+превращаются в словари заранее подготовленными функциями, минуя поля
+DRF. Ответ совпадает с ответом соответствующего ModelSerializer байт в
+байт (порядок ключей, формат ссылок на изображения, сортировка вложенных
+списков); проверяется командой benchmark_serializers.
+"""
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.db.models import QuerySet
+
+from recipes.models import Recipe, RecipeIngredient
+from .serializers import get_followed_authors
+
+
+def make_mapper(names):
+    """ Функция: кортеж values_list -> словарь с ключами names. """
+    names = tuple(names)
+    return lambda row: dict(zip(names, row))
+
+
+class LeanSerializer(ABC):
+    """
+    Базовый класс облегчённых сериализаторов тэгов, ингредиентов и
+    рецептов.
+    """
+
+    def __init__(self, request):
+        self.request = request
+
+    @abstractmethod
+    def get_rows(self, queryset):
+        """ Сужает queryset до нужных столбцов (до постраничного вывода). """
+
+    @abstractmethod
+    def serialize(self, rows):
+        """ Данные ответа по странице строк get_rows(). """
+
+
+class TagLeanSerializer(LeanSerializer):
+    """ Аналог TagSerializer. """
+    columns = ('id', 'title', 'color', 'slug')
+    to_dict = staticmethod(make_mapper(('id', 'name', 'color', 'slug')))
+
+    def get_rows(self, queryset):
+        return queryset.values_list(*self.columns)
+
+    def serialize(self, rows):
+        return list(map(self.to_dict, rows))
+
+
+class IngredientLeanSerializer(LeanSerializer):
+    """ Аналог IngredientSerializer. """
+    columns = ('id', 'name', 'measurement_unit')
+    to_dict = staticmethod(make_mapper(columns))
+
+    def get_rows(self, queryset):
+        if isinstance(queryset, QuerySet):
+            return queryset.values_list(*self.columns)
+        # Результат поиска по каталогу в памяти — уже список моделей.
+        return [
+            (ingredient.id, ingredient.name, ingredient.measurement_unit)
+            for ingredient in queryset
+        ]
+
+    def serialize(self, rows):
+        return list(map(self.to_dict, rows))
+
+
+class RecipeLeanSerializer(LeanSerializer):
+    """
+    Аналог RecipeSerializer. Автор читается тем же запросом, что и
+    рецепт; тэги и состав — двумя запросами на страницу, как и при
+    prefetch_related.
+    """
+    columns = (
+        'id', 'name', 'image', 'image_thumb', 'image_medium', 'text',
+        'cooking_time', 'is_favorited', 'is_in_shopping_cart',
+        'author__email', 'author__id', 'author__username',
+        'author__first_name', 'author__last_name',
+    )
+    # Поля сортировок KeysetPagination (cursor_ordering).
+    cursor_columns = ('pub_date', 'favorites_count')
+    tag_to_dict = staticmethod(make_mapper(('id', 'name', 'color', 'slug')))
+    ingredient_to_dict = staticmethod(make_mapper(
+        ('id', 'name', 'measurement_unit', 'amount')))
+    storage = Recipe._meta.get_field('image').storage
+
+    def get_rows(self, queryset):
+        return queryset.prefetch_related(None).values(
+            *self.columns, *self.cursor_columns)
+
+    def get_tags(self, recipe_ids):
+        tags = defaultdict(list)
+        rows = Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('tag__title').values_list(
+            'recipe_id', 'tag_id', 'tag__title', 'tag__color', 'tag__slug')
+        for recipe_id, *tag in rows:
+            tags[recipe_id].append(self.tag_to_dict(tag))
+        return tags
+
+    def get_ingredients(self, recipe_ids):
+        ingredients = defaultdict(list)
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('ingredient__name').values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount')
+        for recipe_id, *ingredient in rows:
+            ingredients[recipe_id].append(self.ingredient_to_dict(ingredient))
+        return ingredients
+
+    def image_url(self, name):
+        """ Как serializers.ImageField.to_representation. """
+        if not name:
+            return None
+        return self.request.build_absolute_uri(self.storage.url(name))
+
+    def serialize(self, rows):
+        rows = list(rows)
+        recipe_ids = [row['id'] for row in rows]
+        tags = self.get_tags(recipe_ids)
+        ingredients = self.get_ingredients(recipe_ids)
+        followed = set()
+        if not self.request.user.is_anonymous:
+            followed = get_followed_authors(self.request)
+        image_url = self.image_url
+        return [
+            {
+                'id': row['id'],
+                'tags': tags[row['id']],
+                'author': {
+                    'email': row['author__email'],
+                    'id': row['author__id'],
+                    'username': row['author__username'],
+                    'first_name': row['author__first_name'],
+                    'last_name': row['author__last_name'],
+                    'is_subscribed': row['author__id'] in followed,
+                },
+                'ingredients': ingredients[row['id']],
+                'name': row['name'],
+                'image': image_url(row['image']),
+                'image_thumb': image_url(row['image_thumb'] or row['image']),
+                'image_medium': image_url(
+                    row['image_medium'] or row['image']),
+                'text': row['text'],
+                'cooking_time': row['cooking_time'],
+                'is_favorited': row['is_favorited'],
+                'is_in_shopping_cart': row['is_in_shopping_cart'],
+            }
+            for row in rows
+        ]
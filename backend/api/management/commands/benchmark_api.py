@@ -0,0 +1,248 @@
+import math
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import (CaptureQueriesContext, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.authtoken.models import Token
+
+from api.views import COOK_MAX_INGREDIENTS
+from recipes.models import Cart, Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Subscription
+from .explain_recipe_filters import FILTERS
+
+User = get_user_model()
+
+# Наибольшее допустимое число SQL-запросов на один вызов, включая запрос
+# токена при аутентификации. Превышение считается регрессией (N+1).
+RECIPE_LIST_BUDGET = 6
+# Группы запросов: внутри группы запросы выполняются по порядку на каждой
+# итерации, так что запись (POST) отменяется следующим за ней DELETE.
+# Группы с записью выполняются только с --allow-writes.
+# Элемент: (название, метод, путь, параметры, бюджет запросов[,
+# переопределения настроек]).
+BENCHMARKS = (
+    *(
+        ((
+            'recipes ' + ('&'.join(f'{k}={v}' for k, v in params.items())
+                          or '-'),
+            'get', '/api/recipes/', params, RECIPE_LIST_BUDGET
+        ),)
+        for params in (*FILTERS, {'search': '{word}'})
+    ),
+    (('recipe detail', 'get', '/api/recipes/{recipe}/', {}, 5),),
+    (('subscriptions', 'get', '/api/users/subscriptions/', {}, 4),),
+    (('ingredients', 'get', '/api/ingredients/', {'name': '{prefix}'}, 2),),
+    *(
+        ((
+            f'cook {size} ingredients{" (in-memory)" if in_memory else ""}',
+            'get', '/api/recipes/cook/', {'ingredients': f'{{pantry{size}}}'},
+            5 if in_memory else RECIPE_LIST_BUDGET,
+            {'COOK_INDEX_IN_MEMORY': in_memory}
+        ),)
+        for size in (5, COOK_MAX_INGREDIENTS)
+        for in_memory in (False, True)
+    ),
+    (
+        ('download_shopping_cart', 'get',
+         '/api/recipes/download_shopping_cart/', {'format': 'csv'}, 2),
+    ),
+    (
+        ('favorite POST', 'post', '/api/recipes/{target}/favorite/', {}, 4),
+        ('favorite DELETE', 'delete',
+         '/api/recipes/{target}/favorite/', {}, 5),
+    ),
+    (
+        ('shopping_cart POST', 'post',
+         '/api/recipes/{target}/shopping_cart/', {}, 10),
+        ('shopping_cart DELETE', 'delete',
+         '/api/recipes/{target}/shopping_cart/', {}, 11),
+    ),
+    (
+        ('subscribe POST', 'post', '/api/users/{author}/subscribe/', {}, 10),
+        ('subscribe DELETE', 'delete',
+         '/api/users/{author}/subscribe/', {}, 6),
+    ),
+)
+
+
+def get_benchmark_user(user_id=None):
+    """ Пользователь, от имени которого выполняются замеры. """
+    if user_id is not None:
+        user = User.objects.filter(id=user_id).first()
+    else:
+        # Пользователь с корзиной и подписками нагружает все эндпоинты.
+        user = (
+            User.objects.filter(
+                id__in=Cart.objects.values('user')
+            ).filter(
+                id__in=Subscription.objects.values('follower')
+            ).first() or User.objects.first()
+        )
+    if user is None:
+        raise CommandError('Пользователь не найден.')
+    return user
+
+
+def percentile(values, share):
+    """ Перцентиль по методу ближайшего ранга. """
+    values = sorted(values)
+    return values[max(0, math.ceil(share * len(values)) - 1)]
+
+
+def get_context(user):
+    """ Значения для подстановки в пути и параметры запросов. """
+    recipe = (
+        Recipe.objects.filter(favorite__user=user).first()
+        or Recipe.objects.first()
+    )
+    target = Recipe.objects.exclude(
+        favorite__user=user
+    ).exclude(cart__user=user).first()
+    # Самый плодовитый автор, на которого пользователь не подписан:
+    # и фильтр ?author=, и подписка с его рецептами в ответе.
+    author = User.objects.exclude(
+        id=user.id
+    ).exclude(author__follower=user).order_by('-recipes_count').first()
+    tag = Tag.objects.values_list('slug', flat=True).first()
+    ingredient = Ingredient.objects.values_list('name', flat=True).first()
+    # «Запасы» для recipes/cook/: самые употребительные ингредиенты.
+    pantry = list(RecipeIngredient.objects.values(
+        'ingredient'
+    ).annotate(uses=Count('id')).order_by(
+        '-uses', 'ingredient'
+    ).values_list('ingredient', flat=True)[:COOK_MAX_INGREDIENTS])
+    if None in (recipe, target, author, tag, ingredient) or not pantry:
+        raise CommandError(
+            'Недостаточно данных: заполните базу generate_fake_data.')
+    return {
+        **{
+            f'pantry{size}': ','.join(map(str, pantry[:size]))
+            for size in (5, COOK_MAX_INGREDIENTS)
+        },
+        'author': author.id,
+        'tag': tag,
+        'recipe': recipe.id,
+        'target': target.id,
+        'prefix': ingredient[:2],
+        'word': recipe.name.split()[0],
+    }
+
+
+def measure(call, path, params):
+    with CaptureQueriesContext(connection) as captured:
+        started = time.perf_counter()
+        response = call(path, params) if params else call(path)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        elapsed = (time.perf_counter() - started) * 1000
+    if response.status_code >= 400:
+        raise CommandError(
+            f'{response.request["REQUEST_METHOD"]} {path}: '
+            f'ответ {response.status_code}.')
+    return elapsed, len(captured)
+
+
+def run_benchmarks(user, groups=BENCHMARKS, iterations=1, warmup=0):
+    """
+    Вызывает эндпоинты групп groups от имени user: (название, задержки
+    в мс, наибольшее число запросов, бюджет) для каждого запроса.
+    Первые warmup вызовов не учитываются.
+    """
+    context = get_context(user)
+    token, created = Token.objects.get_or_create(user=user)
+    client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+    results = []
+    try:
+        for group in groups:
+            requests = [
+                (
+                    name, getattr(client, method), path.format(**context),
+                    {key: value.format(**context)
+                     for key, value in params.items()},
+                    budget, overrides[0] if overrides else {}
+                )
+                for name, method, path, params, budget, *overrides in group
+            ]
+            timings = [[] for _ in requests]
+            queries = [0] * len(requests)
+            for iteration in range(warmup + iterations):
+                for number, (name, call, path, params, _, overrides) in (
+                        enumerate(requests)):
+                    with override_settings(**overrides):
+                        elapsed, count = measure(call, path, params)
+                    if iteration >= warmup:
+                        timings[number].append(elapsed)
+                        queries[number] = max(queries[number], count)
+            results.extend(
+                (name, timings[number], queries[number], budget)
+                for number, (name, _, _, _, budget, _) in enumerate(requests)
+            )
+    finally:
+        if created:
+            token.delete()
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95) и число SQL-запросов основных '
+        'эндпоинтов API на текущей базе (например, заполненной '
+        'generate_fake_data) и завершается ошибкой, если эндпоинт '
+        'превысил свой бюджет запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=20,
+            help='Сколько раз вызывать каждый эндпоинт.')
+        parser.add_argument(
+            '--warmup', type=int, default=2,
+            help='Сколько вызовов сделать до замеров.')
+        parser.add_argument(
+            '--user', type=int,
+            help='ID пользователя, от имени которого идут запросы.')
+        parser.add_argument(
+            '--allow-writes', action='store_true',
+            help='Замерять и POST/DELETE: избранное, корзину и подписку '
+                 'пользователя. Не запускайте на рабочей базе.')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('Нужна хотя бы одна итерация.')
+        user = get_benchmark_user(options['user'])
+        groups = BENCHMARKS
+        if not options['allow_writes']:
+            groups = [
+                group for group in BENCHMARKS
+                if all(method == 'get' for _, method, *_ in group)
+            ]
+            self.stdout.write(
+                'Запросы с записью пропущены (нужен --allow-writes).')
+        setup_test_environment()
+        try:
+            results = run_benchmarks(
+                user, groups, options['iterations'], options['warmup'])
+        finally:
+            teardown_test_environment()
+        self.stdout.write(
+            f'{"эндпоинт":<45} {"p50, мс":>8} {"p95, мс":>8} '
+            f'{"запросы":>8} {"бюджет":>7}')
+        failed = []
+        for name, timings, queries, budget in results:
+            line = (
+                f'{name:<45} {percentile(timings, 0.5):>8.1f} '
+                f'{percentile(timings, 0.95):>8.1f} '
+                f'{queries:>8} {budget:>7}')
+            if queries > budget:
+                failed.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if failed:
+            raise CommandError(
+                f'Превышен бюджет запросов: {"; ".join(failed)}.')
+        self.stdout.write(self.style.SUCCESS('Бюджеты запросов соблюдены.'))
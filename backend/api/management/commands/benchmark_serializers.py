@@ -0,0 +1,211 @@
+import os
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.cache import bump_recipes_version
+from api.lean import RecipeLeanSerializer
+from api.renderers import ORJSONRenderer
+from api.serializers import RecipeSerializer
+from api.views import IngredientViewSet, RecipeViewSet, TagViewSet
+from recipes.models import Ingredient, Tag
+from .benchmark_api import get_benchmark_user
+from .explain_recipe_filters import FILTERS
+
+SCHEMA_PATH = os.path.join(
+    settings.BASE_DIR, '..', 'docs', 'openapi-schema.yml')
+RECIPE_CASES = (
+    *FILTERS,
+    {'page': '2'},
+    {'cursor': ''},
+    {'ordering': 'popular', 'cursor': ''},
+    {'search': '{word}'},
+)
+# (view, параметры, схема элемента ответа в docs/openapi-schema.yml).
+CASES = (
+    *((RecipeViewSet, params, 'RecipeList') for params in RECIPE_CASES),
+    (TagViewSet, {}, 'Tag'),
+    (IngredientViewSet, {}, 'Ingredient'),
+    (IngredientViewSet, {'name': '{prefix}'}, 'Ingredient'),
+)
+JSON_TYPES = {
+    'integer': int,
+    'number': (int, float),
+    'string': str,
+    'boolean': bool,
+    'array': list,
+    'object': dict,
+}
+
+
+def load_schemas():
+    """ components.schemas из docs/openapi-schema.yml или None. """
+    try:
+        import yaml
+    except ImportError:
+        return None
+    with open(SCHEMA_PATH, encoding='utf-8') as file:
+        return yaml.safe_load(file)['components']['schemas']
+
+
+def validate(value, schema, schemas, path='$'):
+    """ Упрощённая проверка по схеме OpenAPI: типы и обязательные поля. """
+    if '$ref' in schema:
+        schema = schemas[schema['$ref'].rsplit('/', 1)[-1]]
+    if value is None:
+        return [] if schema.get('nullable') else [f'{path}: null']
+    expected = JSON_TYPES.get(schema.get('type', 'object'))
+    if not isinstance(value, expected) or (
+            isinstance(value, bool) and expected is int):
+        return [f'{path}: ожидался {schema["type"]}']
+    errors = []
+    if isinstance(value, list):
+        for number, item in enumerate(value):
+            errors += validate(
+                item, schema.get('items', {}), schemas, f'{path}[{number}]')
+    elif isinstance(value, dict):
+        errors += [
+            f'{path}.{name}: нет поля'
+            for name in schema.get('required', ()) if name not in value
+        ]
+        for name, field_schema in schema.get('properties', {}).items():
+            if name in value:
+                errors += validate(
+                    value[name], field_schema, schemas, f'{path}.{name}')
+    return errors
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает облегчённый путь чтения (LEAN_READ_PATH + orjson) с '
+        'обычными сериализаторами DRF: ответы списков рецептов, тэгов и '
+        'ингредиентов должны совпадать байт в байт и соответствовать '
+        'docs/openapi-schema.yml. Печатает стоимость сериализации одного '
+        'рецепта для обоих путей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes', type=int, default=500,
+            help='Сколько рецептов сериализовать для замера.')
+        parser.add_argument(
+            '--repeat', type=int, default=5,
+            help='Сколько раз повторить замер (берётся лучший).')
+        parser.add_argument(
+            '--user', type=int,
+            help='ID пользователя, от имени которого идут запросы.')
+
+    def handle(self, *args, **options):
+        user = get_benchmark_user(options['user'])
+        schemas = load_schemas()
+        if schemas is None:
+            self.stdout.write(self.style.WARNING(
+                'PyYAML не установлен, проверка по схеме пропущена.'))
+        ingredient = Ingredient.objects.values_list('name', flat=True).first()
+        recipe = RecipeViewSet.queryset.values_list('name', flat=True).first()
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        if None in (ingredient, recipe, tag):
+            raise CommandError(
+                'Недостаточно данных: заполните базу generate_fake_data.')
+        context = {
+            'author': user.id,
+            'tag': tag,
+            'prefix': ingredient[:2],
+            'word': recipe.split()[0],
+        }
+        setup_test_environment()
+        try:
+            failed = self.compare_all(user, context, schemas)
+            self.benchmark(user, options['recipes'], options['repeat'])
+        finally:
+            teardown_test_environment()
+        if failed:
+            raise CommandError(
+                f'Облегчённый путь расходится: {"; ".join(failed)}.')
+        self.stdout.write(self.style.SUCCESS('Ответы совпадают.'))
+
+    def compare_all(self, user, context, schemas):
+        failed = []
+        for viewset, params, schema in CASES:
+            params = {
+                key: value.format(**context) for key, value in params.items()
+            }
+            for current in (user, AnonymousUser()):
+                label = (
+                    f'{viewset.__name__} '
+                    f'{"&".join(f"{k}={v}" for k, v in params.items()) or "-"}'
+                    f'{" (аноним)" if current.is_anonymous else ""}'
+                )
+                errors = self.compare(
+                    viewset, params, current, schema, schemas)
+                if errors:
+                    failed.append(label)
+                    self.stdout.write(self.style.ERROR(
+                        f'{label}: {"; ".join(errors[:5])}'))
+                else:
+                    self.stdout.write(f'{label}: совпадает')
+        return failed
+
+    @staticmethod
+    def get_request(path, params, user):
+        request = APIRequestFactory().get(path, params)
+        if not user.is_anonymous:
+            force_authenticate(request, user)
+        return request
+
+    def compare(self, viewset, params, user, schema, schemas):
+        view = viewset.as_view({'get': 'list'})
+        request = self.get_request('/api/', params, user)
+        responses = []
+        for lean, renderer in ((False, JSONRenderer), (True, ORJSONRenderer)):
+            # Иначе аноним получит из кэша ответ предыдущего прохода.
+            bump_recipes_version()
+            with override_settings(LEAN_READ_PATH=lean):
+                response = view(request)
+            responses.append(renderer().render(response.data))
+        if responses[0] != responses[1]:
+            return ['ответы различаются']
+        if schemas is None:
+            return []
+        data = response.data
+        items = data['results'] if isinstance(data, dict) else data
+        return validate(
+            items, {'type': 'array', 'items': {'$ref': schema}}, schemas)
+
+    def benchmark(self, user, count, repeat):
+        view = RecipeViewSet(
+            action_map={'get': 'list'}, format_kwarg=None, kwargs={})
+        request = view.request = view.initialize_request(
+            self.get_request('/api/recipes/', {}, user))
+        queryset = view.get_queryset()[:count]
+        count = len(queryset)
+
+        def standard():
+            data = RecipeSerializer(
+                queryset.all(), many=True, context={'request': request}
+            ).data
+            return JSONRenderer().render(data)
+
+        def lean():
+            serializer = RecipeLeanSerializer(request)
+            data = serializer.serialize(serializer.get_rows(queryset.all()))
+            return ORJSONRenderer().render(data)
+
+        for title, build in (('DRF + json', standard),
+                             ('values() + orjson', lean)):
+            best = min(self.measure(build) for _ in range(repeat))
+            self.stdout.write(
+                f'{title}: {best / count * 1e6:.0f} мкс на рецепт '
+                f'({count} рецептов, с запросами к базе)')
+
+    @staticmethod
+    def measure(build):
+        started = time.perf_counter()
+        build()
+        return time.perf_counter() - started
@@ -0,0 +1,134 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes.models import Favorite, Tag
+
+User = get_user_model()
+
+FILTERS = (
+    {},
+    {'author': '{author}'},
+    {'tags': '{tag}'},
+    {'tags': '{tag}', 'author': '{author}'},
+    {'is_favorited': '1'},
+    {'is_favorited': '1', 'tags': '{tag}'},
+    {'is_in_shopping_cart': '1'},
+    {'ordering': 'popular'},
+)
+
+
+def find_full_scans(plan):
+    """ Таблицы, которые читаются целиком, без индекса. """
+    if connection.vendor == 'postgresql':
+        scans = []
+        nodes = [json.loads(plan)[0]['Plan']]
+        while nodes:
+            node = nodes.pop()
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(node['Relation Name'])
+            nodes.extend(node.get('Plans', []))
+        return scans
+    # SQLite: «SCAN таблица» без «USING ... INDEX» — полный просмотр.
+    return [
+        line.split()[-1] for line in plan.splitlines()
+        if ' SCAN ' in f' {line} ' and 'INDEX' not in line
+    ]
+
+
+def explain_json(queryset):
+    """
+    План запроса в JSON. QuerySet.explain(format='json') в Django 3.2
+    возвращает str() разобранного списка, а не JSON, поэтому EXPLAIN
+    выполняется напрямую.
+    """
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        # psycopg2 сам разбирает столбец типа json.
+        return json.dumps(cursor.fetchone()[0], ensure_ascii=False, indent=2)
+
+
+def explain_filters(user, tag):
+    """
+    Планы первой страницы /api/recipes/ для каждой комбинации FILTERS:
+    (фильтры, план, таблицы без индекса). На PostgreSQL последовательное
+    чтение отключается, чтобы Seq Scan означал отсутствие индекса, а не
+    выбор планировщика на маленькой таблице.
+    """
+    factory = APIRequestFactory()
+    for params in FILTERS:
+        params = {
+            key: value.format(author=user.id, tag=tag)
+            for key, value in params.items()
+        }
+        request = factory.get('/api/recipes/', params)
+        force_authenticate(request, user)
+        view = RecipeViewSet(
+            action_map={'get': 'list'}, format_kwarg=None, kwargs={})
+        view.request = view.initialize_request(request)
+        queryset = view.filter_queryset(view.get_queryset())
+        page_size = view.paginator.get_page_size(view.request)
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+                plan = explain_json(queryset[:page_size])
+            else:
+                plan = queryset[:page_size].explain()
+        label = '&'.join(f'{k}={v}' for k, v in params.items()) or '-'
+        yield label, plan, find_full_scans(plan)
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для первой страницы /api/recipes/ с каждой '
+        'комбинацией фильтров RecipeFilter и проверяет, что все таблицы '
+        'читаются по индексу. На PostgreSQL последовательное чтение '
+        'отключается (enable_seqscan = off), поэтому Seq Scan в плане '
+        'означает, что подходящего индекса нет.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int,
+            help='ID пользователя, от имени которого строятся запросы.')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        tag = Tag.objects.values_list('slug', flat=True).first()
+        if tag is None:
+            raise CommandError('Нужен хотя бы один тэг.')
+        failed = []
+        for label, plan, scans in explain_filters(user, tag):
+            if scans:
+                failed.append(label)
+                self.stdout.write(self.style.ERROR(
+                    f'{label}: полный просмотр {", ".join(scans)}'))
+            else:
+                self.stdout.write(f'{label}: индексы')
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+        if failed:
+            raise CommandError(
+                f'Без индекса выполняются фильтры: {"; ".join(failed)}.')
+        self.stdout.write(
+            self.style.SUCCESS('Все фильтры используют индексы.'))
+
+    @staticmethod
+    def get_user(user_id):
+        if user_id is not None:
+            user = User.objects.filter(id=user_id).first()
+        else:
+            # Пользователь с избранным даёт более показательные планы.
+            user = (
+                User.objects.filter(id__in=Favorite.objects.values('user'))
+                .first() or User.objects.first()
+            )
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        return user
@@ -0,0 +1,77 @@
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger('api.timing')
+
+
+class QueryStats:
+    """
+    Обёртка для connection.execute_wrapper: считает запросы, суммарное
+    время SQL и повторы одного и того же текста запроса (признак N+1).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.shapes[sql] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.shapes.values())
+
+
+class QueryTimingMiddleware:
+    """
+    Для доли запросов QUERY_TIMING_SAMPLE_RATE считает обращения к базе и
+    отдаёт их в заголовке Server-Timing и в строке лога api.timing с именем
+    маршрута (favorite, shopping_cart, recipes-list, ...).
+
+    При нулевой доле middleware отключается целиком (MiddlewareNotUsed).
+    Запросы, выполненные при отдаче StreamingHttpResponse, не учитываются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = settings.QUERY_TIMING_SAMPLE_RATE
+        if self.sample_rate <= 0:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        stats = QueryStats()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+        total = (time.perf_counter() - started) * 1000
+        sql = stats.duration * 1000
+        response['Server-Timing'] = (
+            f'db;dur={sql:.1f};desc="{stats.count} queries, '
+            f'{stats.duplicates} duplicates", total;dur={total:.1f}'
+        )
+        match = request.resolver_match
+        logger.info(
+            'endpoint=%s method=%s status=%s queries=%d duplicates=%d '
+            'sql_ms=%.1f total_ms=%.1f',
+            match.url_name if match else None, request.method,
+            response.status_code, stats.count, stats.duplicates, sql, total
+        )
+        return response
@@ -1,30 +1,148 @@
-from django.shortcuts import get_object_or_404
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import status
 from rest_framework.response import Response
 
 from recipes.models import Recipe
+from .cache import get_etag, get_recipes_cache_key
+from .serializers import BulkRecipesSerializer, ShowFavoriteSerializer
 
 
-class CustomMixin:
-    serializer_class = None
+class RecipeCounterMixin:
     model_class = None
+    # Поле-счётчик Recipe, которое растёт вместе с model_class.
+    # UserRecipeManager.add пишет строки без post_save, поэтому здесь
+    # счётчик увеличивается явно; уменьшается он в api.signals.
+    counter_field = None
+
+    def increment_counter(self, ids):
+        if self.counter_field is not None:
+            Recipe.objects.filter(id__in=ids).update(
+                **{self.counter_field: F(self.counter_field) + 1})
+
+
+class CustomMixin(RecipeCounterMixin):
+    serializer_class = None
+
+    def added(self, instance):
+        pass
+
+    def removed(self, user, recipe_id):
+        pass
 
+    @transaction.atomic
     def post(self, request, id):
-        data = {
-            'user': request.user.id,
-            'recipe': id
-        }
         serializer = self.serializer_class(
-            data=data, context={'request': request}
+            data={'recipe': id}, context={'request': request}
         )
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        self.added(serializer.save())
+        self.increment_counter([id])
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, id):
-        recipe = get_object_or_404(Recipe, id=id)
-        self.model_class.objects.filter(
-            user=request.user,
-            recipe=recipe
-        ).delete()
+        if self.model_class.objects.remove(request.user, [id]):
+            self.removed(request.user, id)
+        elif not Recipe.objects.filter(id=id).exists():
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class BulkMixin(RecipeCounterMixin):
+    """
+    Массовое добавление и удаление рецептов: {"recipes": [id, ...]}.
+    Рецепты проверяются одним запросом; строки model_class добавляются
+    и удаляются через UserRecipeManager, а счётчики и хуки получают
+    только рецепты, которые этот запрос действительно добавил или удалил.
+    """
+
+    def added_many(self, user, recipe_ids):
+        pass
+
+    def removed_many(self, user, recipe_ids):
+        pass
+
+    def get_recipes(self, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data['recipes']
+
+    @transaction.atomic
+    def post(self, request):
+        recipes = self.get_recipes(request)
+        new_ids = list(self.model_class.objects.add(
+            request.user, [recipe.id for recipe in recipes]))
+        if new_ids:
+            self.added_many(request.user, new_ids)
+            self.increment_counter(new_ids)
+        serializer = ShowFavoriteSerializer(
+            recipes, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def delete(self, request):
+        recipes = self.get_recipes(request)
+        removed_ids = self.model_class.objects.remove(
+            request.user, [recipe.id for recipe in recipes])
+        if removed_ids:
+            self.removed_many(request.user, removed_ids)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class LeanListMixin:
+    """
+    При LEAN_READ_PATH list строит ответ через lean_serializer_class
+    (см. api.lean) вместо serializer_class.
+    """
+    lean_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if not settings.LEAN_READ_PATH or self.lean_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        lean = self.lean_serializer_class(request)
+        rows = lean.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(lean.serialize(page))
+        return Response(lean.serialize(rows))
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы list/retrieve для анонимных пользователей и отдаёт
+    ETag, чтобы браузер и nginx могли перепроверять ответ через 304.
+    Кэш сбрасывается сигналами при изменении рецептов (api.signals).
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if not request.user.is_anonymous:
+            return handler(request, *args, **kwargs)
+        key = get_recipes_cache_key(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            cached = (response.data, get_etag(response.data))
+            cache.set(key, cached, settings.RECIPES_CACHE_TIMEOUT)
+        data, etag = cached
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = Response(data)
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Authorization',))
+        return response
@@ -1,8 +1,190 @@
+import base64
+import json
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination:
+    """
+    Постраничный вывод по ключу (keyset/cursor): вместо OFFSET следующая
+    страница выбирается условием «после последней показанной записи» по
+    полям сортировки, а COUNT(*) по умолчанию не выполняется.
+
+    Сортировка ordering должна заканчиваться уникальным полем (обычно id).
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Некорректный курсор.'
+
+    def __init__(self, page_size, ordering):
+        self.page_size = page_size
+        self.ordering = ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.model = queryset.model
+        self.count = self.get_count(queryset)
+        reverse, values = self.decode_cursor()
+        ordering = self.ordering
+        if reverse:
+            ordering = [self.invert(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self.get_after(ordering, values))
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        self.next_row = self.previous_row = None
+        if rows and (has_more or reverse):
+            self.next_row = rows[-1]
+        if rows and values is not None and (has_more or not reverse):
+            self.previous_row = rows[0]
+        return rows
+
+    def paginate_first_page(self, rows, has_more, request, model):
+        """
+        Первая страница, выбранная заранее (например, взятая из кэша):
+        строки уже упорядочены, нужно только построить ссылку next.
+        """
+        self.request = request
+        self.model = model
+        self.count = None
+        self.previous_row = None
+        self.next_row = rows[-1] if rows and has_more else None
+        return rows
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_link(self.next_row, reverse=False)
+        response['previous'] = self.get_link(self.previous_row, reverse=True)
+        response['results'] = data
+        return Response(response)
+
+    def get_count(self, queryset):
+        mode = self.request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count()
+        if mode == 'approximate':
+            return self.estimate_count(queryset)
+        return None
+
+    @staticmethod
+    def estimate_count(queryset):
+        """ Оценка числа строк из плана запроса (только PostgreSQL). """
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return queryset.count()
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return plan[0]['Plan']['Plan Rows']
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    def get_after(self, ordering, values):
+        """
+        Условие «строго после values» для сортировки ordering:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def get_field(self, name):
+        try:
+            return self.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    def decode_cursor(self):
+        encoded = self.request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            if len(cursor['v']) != len(self.ordering):
+                raise ValueError
+            values = [
+                self.to_python(field, value)
+                for field, value in zip(self.ordering, cursor['v'])
+            ]
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(cursor.get('r')), values
+
+    def to_python(self, field, value):
+        model_field = self.get_field(field.lstrip('-'))
+        if model_field is None:
+            return value
+        return model_field.to_python(value)
+
+    def get_link(self, row, reverse):
+        if row is None:
+            return None
+        if isinstance(row, dict):
+            # Строка values() из облегчённого пути чтения (api.lean).
+            row = SimpleNamespace(**row)
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            model_field = self.get_field(name)
+            if model_field is not None:
+                values.append(model_field.value_to_string(row))
+            else:
+                values.append(getattr(row, name))
+        cursor = {'v': values}
+        if reverse:
+            cursor['r'] = 1
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(cursor).encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encoded)
 
 
 class CustomPagination(PageNumberPagination):
+    """
+    Постраничный вывод по номеру страницы (используется фронтендом).
+    С параметром ?cursor= представления, задающие cursor_ordering,
+    переключаются в режим KeysetPagination.
+    """
     def get_page_size(self, request):
         if request.query_params.get('is_in_shopping_cart'):
             return 999
         return 6
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        ordering = getattr(view, 'cursor_ordering', None)
+        cursor_param = KeysetPagination.cursor_query_param
+        if ordering and cursor_param in request.query_params:
+            self.keyset = KeysetPagination(
+                self.get_page_size(request), ordering)
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
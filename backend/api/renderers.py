@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+from abc import ABC, abstractmethod
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Вывод совпадает с JSONRenderer (компактный
+    UTF-8): даты, Decimal и прочие типы кодируются тем же JSONEncoder DRF,
+    U+2028/U+2029 экранируются так же. Отличаются только вещественные
+    числа меньше 1e-4 и от 1e16: orjson пишет их без «+» в экспоненте или
+    без экспоненты. Если orjson не установлен, запрошен отступ или данные
+    orjson не поддерживает, работает JSONRenderer.
+    """
+    options = 0 if orjson is None else (
+        orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        indent = self.get_indent(
+            accepted_media_type, renderer_context or {})
+        if orjson is None or data is None or indent:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=JSONEncoder().default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context)
+        return ret.replace(
+            b'\xe2\x80\xa8', b'\\u2028'
+        ).replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ShoppingListRenderer(BaseRenderer, ABC):
+    """
+    Базовый рендерер списка покупок.
+
+    Строки списка отдаются по одной через stream(), поэтому ответ можно
+    передавать в StreamingHttpResponse, не собирая весь файл в памяти.
+    Каждая строка — словарь с ключами name, measurement_unit и amount.
+    """
+    charset = 'utf-8'
+    filename = 'shopping_list'
+
+    @abstractmethod
+    def stream(self, rows):
+        """ Части файла (str) для строк rows. """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            # Ошибки (401, 404) приходят словарём, а не списком строк.
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+        return ''.join(self.stream(data or [])).encode(self.charset)
+
+    def get_filename(self):
+        return f'{self.filename}.{self.format}'
+
+
+class ShoppingListTextRenderer(ShoppingListRenderer):
+    """ Список покупок в виде текстового файла. """
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        yield 'Cписок покупок:'
+        for row in rows:
+            yield (
+                f"\n{row['name']} - "
+                f"{row['amount']} {row['measurement_unit']}"
+            )
+
+
+class ShoppingListCSVRenderer(ShoppingListRenderer):
+    """ Список покупок в формате CSV. """
+    media_type = 'text/csv'
+    format = 'csv'
+    header = ('name', 'amount', 'measurement_unit')
+
+    def stream(self, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.header)
+        for row in rows:
+            writer.writerow([row[field] for field in self.header])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+
+class ShoppingListJSONRenderer(ShoppingListRenderer):
+    """ Список покупок в виде JSON-массива. """
+    media_type = 'application/json'
+    format = 'json'
+
+    def stream(self, rows):
+        separator = '['
+        for row in rows:
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
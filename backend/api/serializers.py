@@ -1,11 +1,39 @@
-from django.db.models import F
-from django.shortcuts import get_object_or_404
-from drf_extra_fields.fields import Base64ImageField
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework import serializers
+from rest_framework.validators import UniqueTogetherValidator
 
+from recipes.images import discard_renditions, schedule_renditions
 from recipes.models import (Cart, Favorite, Ingredient, Recipe,
-                            RecipeIngredient, Tag)
+                            RecipeIngredient, ShoppingListItem, Tag)
 from users.models import Subscription, User
+from .fields import RecipeImageField, RenditionField
+
+BULK_RECIPES_LIMIT = 100
+
+
+def get_ingredients_prefetch():
+    """ Prefetch состава рецепта для RecipeSerializer.ingredients. """
+    return Prefetch(
+        'recipe',
+        queryset=RecipeIngredient.objects.select_related(
+            'ingredient').order_by('ingredient__name')
+    )
+
+
+def get_followed_authors(request):
+    """
+    ID авторов, на которых подписан текущий пользователь.
+    Загружается одним запросом и хранится на объекте запроса, так что все
+    сериализаторы ответа отвечают на is_subscribed без обращения к базе.
+    """
+    if not hasattr(request, 'followed_authors'):
+        request.followed_authors = set(
+            Subscription.objects.filter(
+                follower=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request.followed_authors
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -44,32 +72,39 @@ class UserSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(
-            follower=request.user, author=obj
-        ).exists()
+        return obj.id in get_followed_authors(request)
 
 
 class ShowFavoriteSerializer(serializers.ModelSerializer):
     """ Сериализатор для отображения избранных рецептов. """
+    image_thumb = RenditionField()
+    image_medium = RenditionField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'name', 'image', 'cooking_time']
+        fields = [
+            'id', 'name', 'image', 'image_thumb', 'image_medium',
+            'cooking_time'
+        ]
 
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """ Сериализатор избранных рецептов. """
-    class Meta:
-        model = Favorite
-        fields = ['user', 'recipe']
+class UserRecipeSerializer(serializers.ModelSerializer):
+    """
+    Базовый сериализатор связи пользователь — рецепт.
+    Повтор отсекает уникальное ограничение в UserRecipeManager.add,
+    а не validate.
+    """
+    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    exists_message = None
 
-    def validate(self, data):
-        if Favorite.objects.filter(
-                user=self.context['request'].user,
-                recipe=data['recipe']):
+    def create(self, validated_data):
+        user, recipe = validated_data['user'], validated_data['recipe']
+        added = self.Meta.model.objects.add(user, [recipe.id])
+        if not added:
             raise serializers.ValidationError({
-                'errors': 'Рецепт уже в избранном.'
+                'errors': [self.exists_message]
             })
-        return data
+        return self.Meta.model(id=added[recipe.id], user=user, recipe=recipe)
 
     def to_representation(self, instance):
         return ShowFavoriteSerializer(instance.recipe, context={
@@ -77,32 +112,63 @@ class FavoriteSerializer(serializers.ModelSerializer):
         }).data
 
 
-class CartSerializer(serializers.ModelSerializer):
+class FavoriteSerializer(UserRecipeSerializer):
+    """ Сериализатор избранных рецептов. """
+    exists_message = 'Рецепт уже в избранном.'
+
+    class Meta:
+        model = Favorite
+        fields = ['user', 'recipe']
+
+
+class CartSerializer(UserRecipeSerializer):
     """ Сериализатор списка покупок. """
+    exists_message = 'Рецепт уже есть в списке покупок.'
+
     class Meta:
         model = Cart
         fields = ['user', 'recipe']
 
-    def validate(self, data):
-        if Cart.objects.filter(
-                user=self.context['request'].user,
-                recipe=data['recipe']):
-            raise serializers.ValidationError({
-                'errors': 'Рецепт уже есть в списке покупок.'
-            })
-        return data
 
-    def to_representation(self, instance):
-        return ShowFavoriteSerializer(instance.recipe, context={
-            'request': self.context.get('request')
-        }).data
+class BulkRecipesSerializer(serializers.Serializer):
+    """
+    Список id рецептов для массового добавления в избранное или корзину.
+    Все рецепты проверяются одним запросом; в validated_data['recipes']
+    лежат объекты Recipe в порядке запроса, без повторов.
+    """
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_RECIPES_LIMIT
+    )
+
+    def validate_recipes(self, value):
+        ids = list(dict.fromkeys(value))
+        recipes = Recipe.objects.only(
+            *ShowFavoriteSerializer.Meta.fields
+        ).in_bulk(ids)
+        missing = [
+            recipe_id for recipe_id in ids if recipe_id not in recipes
+        ]
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {", ".join(map(str, missing))}.')
+        return [recipes[recipe_id] for recipe_id in ids]
+
+
+def get_recipes_limit(request):
+    """ Значение ?recipes_limit= или None, если оно не задано. """
+    limit = request.query_params.get('recipes_limit')
+    if limit and limit.isdigit():
+        return int(limit)
+    return None
 
 
 class ShowSubscriptionsSerializer(serializers.ModelSerializer):
     """ Сериализатор для отображения подписок пользователя. """
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -118,26 +184,27 @@ class ShowSubscriptionsSerializer(serializers.ModelSerializer):
         ]
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
-        return Subscription.objects.filter(
-            follower=request.user, author=obj).exists()
+        return obj.id in get_followed_authors(request)
 
     def get_recipes(self, obj):
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
             return False
-        recipes = Recipe.objects.filter(author=obj)
-        limit = request.query_params.get('recipes_limit')
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'prefetched_recipes'):
+            recipes = obj.prefetched_recipes
+        else:
+            recipes = Recipe.objects.filter(author=obj)
+            limit = get_recipes_limit(request)
+            if limit:
+                recipes = recipes[:limit]
         return ShowFavoriteSerializer(
             recipes, many=True, context={'request': request}).data
 
-    def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj).count()
-
 
 class SubscriptionSerializer(serializers.ModelSerializer):
     """ Сериализатор подписок. """
@@ -150,13 +217,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError({
                 'errors': 'Нельзя подписаться на самого себя.'
             })
-        if Subscription.objects.filter(
-                follower=self.context['request'].user,
-                author=data['author']):
+        return data
+
+    def create(self, validated_data):
+        # Повторную подписку отсекает ограничение unique_subscription,
+        # отдельный запрос на проверку не нужен.
+        try:
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
             raise serializers.ValidationError({
-                'errors': 'Вы уже подписаны на данного автора.'
+                'errors': ['Вы уже подписаны на данного автора.']
             })
-        return data
 
     def to_representation(self, instance):
         return ShowSubscriptionsSerializer(
@@ -170,6 +242,12 @@ class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ['id', 'name', 'measurement_unit']
+        validators = [
+            UniqueTogetherValidator(
+                queryset=Ingredient.objects.all(),
+                fields=['name', 'measurement_unit']
+            )
+        ]
 
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
@@ -184,6 +262,19 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
+class ShoppingListItemSerializer(serializers.ModelSerializer):
+    """ Сериализатор позиций списка покупок. """
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+    amount = serializers.ReadOnlyField(source='total')
+
+    class Meta:
+        model = ShoppingListItem
+        fields = ['id', 'name', 'measurement_unit', 'amount']
+
+
 class AddIngredientRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор для добавления ингредиентов в рецепт. """
     id = serializers.IntegerField()
@@ -198,9 +289,11 @@ class RecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор рецептов. """
     tags = TagSerializer(many=True)
     author = UserSerializer()
-    ingredients = serializers.SerializerMethodField()
+    ingredients = RecipeIngredientSerializer(many=True, source='recipe')
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_thumb = RenditionField()
+    image_medium = RenditionField()
 
     class Meta:
         model = Recipe
@@ -211,19 +304,17 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_thumb',
+            'image_medium',
             'text',
             'cooking_time',
             'is_favorited',
             'is_in_shopping_cart'
         ]
 
-    def get_ingredients(self, obj):
-        ingredients = obj.ingredients.values(
-            'id', 'name', 'measurement_unit', amount=F('ingredient__amount')
-        )
-        return ingredients
-
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -232,6 +323,8 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
@@ -240,13 +333,22 @@ class RecipeSerializer(serializers.ModelSerializer):
         ).exists()
 
 
+class CookRecipeSerializer(RecipeSerializer):
+    """ Рецепт с долей ингредиентов, которые уже есть у пользователя. """
+    matched = serializers.IntegerField(read_only=True)
+    coverage = serializers.FloatField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['matched', 'coverage']
+
+
 class CreateRecipeSerializer(serializers.ModelSerializer):
     """ Сериализатор для создания рецепта. """
     author = UserSerializer(read_only=True)
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True)
     ingredients = AddIngredientRecipeSerializer(many=True, source='recipe')
-    image = Base64ImageField(required=True)
+    image = RecipeImageField(required=True)
 
     class Meta:
         model = Recipe
@@ -261,6 +363,15 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             'cooking_time'
         ]
 
+    def save(self, **kwargs):
+        image = self.validated_data.get('image')
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл уже перенесён в хранилище.
+            if image is not None:
+                image.close()
+
     def validate(self, data):
         ingredients = data.get('recipe')
         all_ingredients = list()
@@ -279,12 +390,21 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                    'ingredient': 'Ингредиенты должны быть уникальными!'
                 })
             all_ingredients.append(ingredient['id'])
+        found = Ingredient.objects.in_bulk(all_ingredients)
+        missing = [
+            ingredient_id for ingredient_id in all_ingredients
+            if ingredient_id not in found
+        ]
+        if missing:
+            raise serializers.ValidationError({
+               'ingredients': f'Ингредиенты не найдены: {missing}.'
+            })
         return data
 
     def create_ingredients(self, ingredients, recipe):
         objs = [
             RecipeIngredient(
-                ingredient=get_object_or_404(Ingredient, id=ingredient['id']),
+                ingredient_id=ingredient['id'],
                 recipe=recipe,
                 amount=ingredient['amount'],
             )
@@ -292,6 +412,34 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         ]
         RecipeIngredient.objects.bulk_create(objs)
 
+    def update_ingredients(self, ingredients, recipe):
+        """
+        Применяет к рецепту только изменения состава: меняет количество
+        у оставшихся ингредиентов, удаляет убранные и добавляет новые.
+        """
+        existing = {item.ingredient_id: item for item in recipe.recipe.all()}
+        old_amounts = {id: item.amount for id, item in existing.items()}
+        new_amounts = {item['id']: item['amount'] for item in ingredients}
+        changed = []
+        removed = []
+        for ingredient_id, item in existing.items():
+            amount = new_amounts.get(ingredient_id)
+            if amount is None:
+                removed.append(item.id)
+            elif amount != item.amount:
+                item.amount = amount
+                changed.append(item)
+        RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        if removed:
+            RecipeIngredient.objects.filter(id__in=removed).delete()
+        self.create_ingredients(
+            [item for item in ingredients if item['id'] not in existing],
+            recipe
+        )
+        ShoppingListItem.objects.update_recipe(
+            recipe, old_amounts, new_amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
         ingredients = validated_data.pop('recipe')
@@ -299,19 +447,25 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         new_recipe = Recipe.objects.create(**validated_data)
         self.create_ingredients(ingredients, new_recipe)
         new_recipe.tags.set(tags)
+        schedule_renditions(new_recipe)
         return new_recipe
 
+    @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe')
+        if 'image' in validated_data:
+            discard_renditions(recipe)
+            schedule_renditions(recipe)
         super().update(recipe, validated_data)
         recipe.tags.set(tags)
         if ingredients:
-            recipe.ingredients.clear()
-            self.create_ingredients(ingredients, recipe)
+            self.update_ingredients(ingredients, recipe)
         return recipe
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags', get_ingredients_prefetch())
         return RecipeSerializer(instance, context={
             'request': self.context.get('request')
         }).data
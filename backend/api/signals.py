@@ -0,0 +1,188 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from recipes.search import index_recipe, unindex_recipe
+from users.models import Subscription
+from .authentication import token_cache
+from .cache import bump_recipes_version, invalidate_feeds
+from .catalog import cook_index, ingredient_catalog, tag_catalog
+
+User = get_user_model()
+
+# Поля пользователя, которые выводятся в ответах по рецептам (автор).
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+
+
+# Справочники сбрасываются после фиксации: иначе другой процесс может
+# увидеть новую версию и перечитать ещё старые данные.
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_catalog(**kwargs):
+    transaction.on_commit(ingredient_catalog.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def invalidate_tag_catalog(**kwargs):
+    transaction.on_commit(tag_catalog.invalidate)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def invalidate_cook_index(update_fields=None, **kwargs):
+    # Состав новых рецептов пишется bulk_create без сигналов, поэтому
+    # индекс сбрасывается после фиксации транзакции сохранения рецепта.
+    # Частичные сохранения (копии фотографии) состав не меняют, а индекс
+    # после сброса каждый процесс строит заново.
+    if update_fields is not None:
+        return
+    transaction.on_commit(cook_index.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def update_search_index(instance, using, update_fields=None, **kwargs):
+    fields = {'name', 'text'}
+    if update_fields is None or fields & set(update_fields):
+        index_recipe(instance, using)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_from_search_index(instance, using, **kwargs):
+    unindex_recipe(instance, using)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+@receiver([post_save, post_delete], sender=Tag)
+@receiver([post_save, post_delete], sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipes_cache(**kwargs):
+    # Как и справочники, после фиксации: иначе анонимный запрос между
+    # сменой версии и фиксацией закэширует старые данные под новой
+    # версией.
+    transaction.on_commit(bump_recipes_version)
+
+
+@receiver(pre_save, sender=User)
+def remember_author_fields(instance, update_fields=None, **kwargs):
+    # save() без update_fields не говорит, что изменилось: прежние
+    # значения читаются, чтобы сравнить их в post_save.
+    instance._old_author_fields = None
+    if instance.pk and update_fields is None:
+        instance._old_author_fields = User.objects.filter(
+            pk=instance.pk).values_list(*AUTHOR_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_recipes_cache_for_author(instance, created, update_fields=None,
+                                        **kwargs):
+    # Вход (last_login), смена пароля и счётчики на ответы по рецептам
+    # не влияют. Удаление автора сбрасывает кэш через удаление рецептов.
+    if created:
+        return
+    if update_fields is not None:
+        changed = bool(set(update_fields) & set(AUTHOR_FIELDS))
+    else:
+        changed = instance._old_author_fields != tuple(
+            getattr(instance, field) for field in AUTHOR_FIELDS)
+    if changed:
+        transaction.on_commit(bump_recipes_version)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, created, update_fields=None, **kwargs):
+    # Смена пароля, деактивация и правка профиля должны сразу дойти до
+    # CachedTokenAuthentication; вход меняет только last_login.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    token_cache.invalidate(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    token_cache.invalidate([instance.key])
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def invalidate_followers_feeds(instance, created=True, **kwargs):
+    # Правка рецепта не меняет состав первой страницы ленты (в кэше
+    # только id), а новый или удалённый рецепт меняет её у всех
+    # подписчиков автора.
+    if not created:
+        return
+    author_id = instance.author_id
+    transaction.on_commit(lambda: invalidate_feeds(
+        Subscription.objects.filter(
+            author_id=author_id).values_list('follower_id', flat=True)))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def invalidate_follower_feed(instance, **kwargs):
+    follower_id = instance.follower_id
+    transaction.on_commit(lambda: invalidate_feeds([follower_id]))
+
+
+def increment_counter(model, field, pk, created, raw=False):
+    # loaddata (raw) загружает счётчики вместе с данными.
+    if created and not raw:
+        model.objects.filter(pk=pk).update(**{field: F(field) + 1})
+
+
+def decrement_counter(model, field, pk):
+    # Счётчик мог разойтись с таблицей (см. reconcile_counters), поэтому
+    # ниже нуля он не опускается.
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) - 1, 0)})
+
+
+# Счётчики меняются по post_save и post_delete, а не в представлениях:
+# так их учитывают и админка, и каскадное удаление пользователя или
+# рецепта. Строки без сигналов (bulk_create, UserRecipeManager.add)
+# учитывает тот, кто их пишет.
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(instance, created, raw=False, **kwargs):
+    increment_counter(
+        Recipe, 'favorites_count', instance.recipe_id, created, raw)
+
+
+@receiver(post_save, sender=Cart)
+def increment_carts_count(instance, created, raw=False, **kwargs):
+    increment_counter(Recipe, 'carts_count', instance.recipe_id, created, raw)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, raw=False, **kwargs):
+    increment_counter(User, 'recipes_count', instance.author_id, created, raw)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_followers_count(instance, created, raw=False, **kwargs):
+    increment_counter(
+        User, 'followers_count', instance.author_id, created, raw)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(instance, **kwargs):
+    decrement_counter(Recipe, 'favorites_count', instance.recipe_id)
+
+
+@receiver(post_delete, sender=Cart)
+def decrement_carts_count(instance, **kwargs):
+    decrement_counter(Recipe, 'carts_count', instance.recipe_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    decrement_counter(User, 'recipes_count', instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_followers_count(instance, **kwargs):
+    decrement_counter(User, 'followers_count', instance.author_id)
@@ -0,0 +1,24 @@
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from api.management.commands.benchmark_api import run_benchmarks
+from .utils import create_recipes, create_user
+
+
+class QueryBudgetTest(TransactionTestCase):
+    """
+    Эндпоинты укладываются в бюджеты запросов benchmark_api. Внутри
+    TestCase транзакции представлений стали бы точками сохранения
+    с лишними запросами, которых нет в работе.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+        create_recipes(self.user, 8)
+
+    def test_budgets(self):
+        # Первый проход прогревает кэши токенов и справочников.
+        for name, _, queries, budget in run_benchmarks(self.user, warmup=1):
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(queries, budget)
@@ -0,0 +1,72 @@
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.cache import get_feed_cache_key, get_recipes_version
+from users.models import Subscription, User
+from .utils import create_recipes, create_user
+
+
+class AuthorCacheInvalidationTest(TestCase):
+    """ Кэш ответов по рецептам сбрасывается только правкой полей автора. """
+
+    def setUp(self):
+        cache.clear()
+        create_recipes(create_user('reader'), 1)
+        self.author = User.objects.get(username='author0')
+        self.version = get_recipes_version()
+
+    def assert_invalidated(self, invalidated):
+        self.assertEqual(
+            get_recipes_version() != self.version, invalidated)
+
+    def save_author(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.save()
+
+    def test_author_name_change(self):
+        self.author.first_name = 'Другое имя'
+        self.save_author()
+        self.assert_invalidated(True)
+
+    def test_unchanged_save(self):
+        self.save_author()
+        self.assert_invalidated(False)
+
+    def test_password_change(self):
+        self.author.set_password('another-password')
+        self.save_author()
+        self.assert_invalidated(False)
+
+    def test_login(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.author)
+        self.assert_invalidated(False)
+
+
+class CommitInvalidationTest(TestCase):
+    """
+    Кэш сбрасывается после фиксации транзакции: запрос, пришедший до
+    неё, не должен закэшировать старые данные под новой версией.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.reader = create_user('reader')
+        self.recipe = create_recipes(self.reader, 1)[0]
+
+    def test_recipes_version(self):
+        version = get_recipes_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+            self.assertEqual(get_recipes_version(), version)
+        self.assertNotEqual(get_recipes_version(), version)
+
+    def test_follower_feed(self):
+        key = get_feed_cache_key(self.reader.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.set(key, [self.recipe.id])
+            Subscription.objects.filter(follower=self.reader).delete()
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
@@ -0,0 +1,34 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from api.catalog import IngredientCatalog, TagCatalog
+from recipes.models import Ingredient, Tag
+
+
+class CatalogTest(TestCase):
+    """ Справочники в памяти процесса. """
+
+    def setUp(self):
+        cache.clear()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Морская соль', 'Перец')
+        )
+
+    def test_search(self):
+        catalog = IngredientCatalog(ttl=60, check_interval=0)
+        self.assertEqual(
+            [ingredient.name for ingredient in catalog.search('со', 10)],
+            ['Соль', 'Морская соль'])
+        self.assertEqual(len(catalog.search('с', 2)), 2)
+
+    def test_invalidation_reaches_other_processes(self):
+        # reader — справочник другого процесса: сигнал сбрасывает только
+        # tag_catalog этого процесса, о правке reader узнаёт по общей
+        # версии в кэше.
+        reader = TagCatalog(ttl=60, check_interval=0)
+        self.assertEqual(reader.get_ids(['lunch']), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            tag = Tag.objects.create(
+                title='Обед', slug='lunch', color='#49B64E')
+        self.assertEqual(reader.get_ids(['lunch']), [tag.id])
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.cache import get_version
+from api.catalog import cook_index
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from .utils import create_recipes, create_user
+
+
+class CookTest(TestCase):
+    """
+    recipes/cook/: индекс в памяти ранжирует рецепты так же, как
+    SQL-путь, и не сбрасывается без изменения состава.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        recipes = create_recipes(create_user('reader'), 4)
+        cls.ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        # Из двух первых ингредиентов этот рецепт собирается целиком.
+        cls.simple = Recipe.objects.create(
+            author=recipes[0].author, name='Простой рецепт',
+            image='recipes/test.jpg', text='Описание', cooking_time=5)
+        RecipeIngredient.objects.create(
+            recipe=cls.simple, ingredient_id=cls.ingredients[0], amount=1)
+
+    def setUp(self):
+        cache.clear()
+        cook_index.invalidate()
+
+    def cook(self):
+        response = APIClient().get('/api/recipes/cook/', {
+            'ingredients': ','.join(map(str, self.ingredients[:2]))
+        })
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_in_memory_matches_sql(self):
+        with override_settings(COOK_INDEX_IN_MEMORY=True):
+            in_memory = self.cook()
+        with override_settings(COOK_INDEX_IN_MEMORY=False):
+            self.assertEqual(self.cook(), in_memory)
+        self.assertEqual(in_memory[0], self.simple.id)
+        self.assertEqual(len(in_memory), 5)
+
+    def test_partial_save_keeps_index(self):
+        version = get_version(cook_index.version_key)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.simple.save(update_fields=['image_thumb'])
+        self.assertEqual(get_version(cook_index.version_key), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.simple.save()
+        self.assertNotEqual(get_version(cook_index.version_key), version)
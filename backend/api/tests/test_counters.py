@@ -0,0 +1,77 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Subscription, User
+from .utils import create_recipes, create_user
+
+
+class CountersTest(TestCase):
+    """
+    Счётчики меняются при любом создании и удалении строк, не только
+    через API, и не уходят ниже нуля.
+    """
+
+    def setUp(self):
+        self.user = create_user('reader')
+        # Первый рецепт не в избранном и не в корзине, второй — в обоих.
+        self.recipe, self.saved_recipe = create_recipes(self.user, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_favorite_views(self):
+        self.client.post(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.client.delete(f'/api/recipes/{self.recipe.id}/favorite/')
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_bulk_cart_view(self):
+        self.client.post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [self.recipe.id, self.saved_recipe.id]},
+            format='json')
+        self.recipe.refresh_from_db()
+        self.saved_recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 1)
+        self.assertEqual(self.saved_recipe.carts_count, 1)
+
+    def test_orm_create(self):
+        author = User.objects.get(id=self.recipe.author_id)
+        followers = author.followers_count
+        recipes = author.recipes_count
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Cart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(
+            follower=create_user('follower'), author=author)
+        Recipe.objects.create(
+            author=author, name='Новый', image='recipes/test.jpg',
+            text='Описание', cooking_time=5)
+        self.recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+        self.assertEqual(self.recipe.carts_count, 1)
+        self.assertEqual(author.followers_count, followers + 1)
+        self.assertEqual(author.recipes_count, recipes + 1)
+
+    def test_cascade_delete(self):
+        Recipe.objects.filter(id=self.saved_recipe.id).update(
+            favorites_count=1, carts_count=1)
+        author = User.objects.get(author__follower=self.user)
+        User.objects.filter(id=author.id).update(followers_count=1)
+        self.user.delete()
+        self.saved_recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(self.saved_recipe.favorites_count, 0)
+        self.assertEqual(self.saved_recipe.carts_count, 0)
+        self.assertEqual(author.followers_count, 0)
+
+    def test_drifted_counter_stays_at_zero(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.filter(id=self.recipe.id).update(favorites_count=0)
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.id}/favorite/')
+        self.assertEqual(response.status_code, 204)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
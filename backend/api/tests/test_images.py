@@ -0,0 +1,78 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.images import get_backend
+from recipes.models import Ingredient, Recipe, Tag
+from .utils import create_user
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def encode_image(color, wrap=None):
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 300), color).save(buffer, 'JPEG')
+    data = base64.b64encode(buffer.getvalue()).decode()
+    if wrap:
+        data = '\r\n'.join(
+            data[start:start + wrap] for start in range(0, len(data), wrap))
+    return f'data:image/jpeg;base64,{data}'
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    IMAGE_RENDITION_BACKEND='recipes.images.SyncBackend')
+class RecipeImageTest(TestCase):
+    """ Загрузка фотографии рецепта и замена её уменьшенных копий. """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # Бэкенд очереди запоминается при первом вызове.
+        get_backend.cache_clear()
+        self.addCleanup(get_backend.cache_clear)
+        self.client = APIClient()
+        self.client.force_authenticate(create_user('author'))
+        tag = Tag.objects.create(title='Тэг', slug='tag', color='#E26C2D')
+        ingredient = Ingredient.objects.create(
+            name='Ингредиент', measurement_unit='г')
+        self.data = {
+            'ingredients': [{'id': ingredient.id, 'amount': 1}],
+            'tags': [tag.id],
+            'name': 'Рецепт',
+            'text': 'Описание',
+            'cooking_time': 10,
+        }
+
+    def save_recipe(self, image, recipe=None):
+        data = {**self.data, 'image': image}
+        with self.captureOnCommitCallbacks(execute=True):
+            if recipe is None:
+                response = self.client.post(
+                    '/api/recipes/', data, format='json')
+            else:
+                response = self.client.put(
+                    f'/api/recipes/{recipe.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200 if recipe else 201)
+        return Recipe.objects.get(id=response.json()['id'])
+
+    def test_wrapped_base64(self):
+        recipe = self.save_recipe(encode_image('red', wrap=76))
+        self.assertTrue(recipe.image)
+
+    def test_replaced_renditions_are_deleted(self):
+        recipe = self.save_recipe(encode_image('red'))
+        old_files = [recipe.image_thumb.path, recipe.image_medium.path]
+        self.assertTrue(all(map(os.path.exists, old_files)))
+        recipe = self.save_recipe(encode_image('blue'), recipe)
+        self.assertFalse(any(map(os.path.exists, old_files)))
+        self.assertTrue(os.path.exists(recipe.image_thumb.path))
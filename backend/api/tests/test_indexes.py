@@ -0,0 +1,23 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from api.management.commands.explain_recipe_filters import explain_filters
+from .utils import create_recipes, create_user
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'Планы проверяются на PostgreSQL.')
+class RecipeFilterIndexesTest(TestCase):
+    """ Каждый фильтр списка рецептов читает таблицы по индексу. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        cls.tag = create_recipes(cls.user, 8)[0].tags.first().slug
+
+    def test_filters_use_indexes(self):
+        for label, plan, scans in explain_filters(self.user, self.tag):
+            with self.subTest(filters=label):
+                self.assertEqual(scans, [], plan)
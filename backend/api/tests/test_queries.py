@@ -0,0 +1,45 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.pagination import CustomPagination
+from .utils import create_recipes, create_user
+
+RECIPES_COUNT = 8
+
+
+class RecipeListQueriesTest(TestCase):
+    """ Число запросов списка рецептов не зависит от размера страницы. """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        create_recipes(cls.user, RECIPES_COUNT)
+
+    def count_queries(self, client, page_size):
+        # Иначе анонимный ответ второго вызова придёт из кэша.
+        cache.clear()
+        with mock.patch.object(
+                CustomPagination, 'get_page_size', return_value=page_size):
+            with CaptureQueriesContext(connection) as captured:
+                response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), page_size)
+        return len(captured)
+
+    def assert_constant(self, client):
+        self.assertEqual(
+            self.count_queries(client, 2),
+            self.count_queries(client, RECIPES_COUNT))
+
+    def test_anonymous(self):
+        self.assert_constant(APIClient())
+
+    def test_authenticated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assert_constant(client)
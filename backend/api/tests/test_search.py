@@ -0,0 +1,37 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from .utils import create_recipes, create_user
+
+
+class RecipeSearchTest(TestCase):
+    """ Поиск ?search= по названию и описанию рецепта. """
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_recipes(create_user('reader'), 2)[0].author
+        cls.borscht = Recipe.objects.create(
+            author=author, name='Борщ украинский', image='recipes/test.jpg',
+            text='Свёкла, капуста и картофель', cooking_time=90)
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, text):
+        response = APIClient().get('/api/recipes/', {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name(self):
+        self.assertEqual(self.search('борщ'), [self.borscht.id])
+
+    def test_text(self):
+        self.assertEqual(self.search('капуста'), [self.borscht.id])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('пельмени'), [])
+
+    def test_no_words(self):
+        self.assertEqual(self.search('"*('), [])
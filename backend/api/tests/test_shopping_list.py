@@ -0,0 +1,123 @@
+import threading
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from recipes.models import Cart, ShoppingListItem
+from .utils import create_recipes, create_user
+
+
+class SingleAndBulkCartMixin:
+    """
+    Рецепт добавляется в корзину одиночным и массовым запросом: в
+    корзине и в счётчике он учитывается один раз, агрегат списка
+    покупок сходится с корзиной.
+    """
+
+    def setUp(self):
+        self.user = create_user('reader')
+        # Первый рецепт не в корзине.
+        self.recipe, self.other = create_recipes(self.user, 3)[::2]
+        ShoppingListItem.objects.rebuild()
+
+    def add_single(self):
+        return self.get_client().post(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/')
+
+    def add_bulk(self):
+        return self.get_client().post(
+            '/api/recipes/shopping_cart/',
+            {'recipes': [self.recipe.id, self.other.id]}, format='json')
+
+    def get_client(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client
+
+    def assert_consistent(self):
+        self.assertEqual(self.user.cart.filter(recipe=self.recipe).count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 1)
+        call_command('rebuild_shopping_list', '--verify', stdout=StringIO())
+
+
+class SingleAndBulkCartTest(SingleAndBulkCartMixin, TestCase):
+
+    def test_single_then_bulk(self):
+        self.assertEqual(self.add_single().status_code, 201)
+        self.assertEqual(self.add_bulk().status_code, 201)
+        self.assert_consistent()
+
+    def test_bulk_then_single(self):
+        self.assertEqual(self.add_bulk().status_code, 201)
+        self.assertEqual(self.add_single().status_code, 400)
+        self.assert_consistent()
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Параллельные транзакции проверяются на PostgreSQL.')
+class ConcurrentSingleAndBulkCartTest(SingleAndBulkCartMixin,
+                                      TransactionTestCase):
+
+    def test_concurrent(self):
+        barrier = threading.Barrier(2)
+        statuses = []
+
+        def run(request):
+            try:
+                barrier.wait()
+                statuses.append(request().status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=run, args=(request,))
+            for request in (self.add_single, self.add_bulk)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Вторая вставка ждёт фиксации первой и ничего не добавляет:
+        # одиночный запрос тогда получает 400, массовый пропускает уже
+        # добавленный рецепт.
+        self.assertIn(sorted(statuses), ([201, 201], [201, 400]))
+        self.assert_consistent()
+
+
+class RecipeDeleteTest(TestCase):
+    """
+    Удаление рецепта убирает его из списков покупок всех, у кого он в
+    корзине, одним проходом, сколько бы таких корзин ни было.
+    """
+
+    def setUp(self):
+        reader = create_user('reader')
+        # Оба рецепта в корзине reader, второй ещё у трёх пользователей.
+        self.recipe, self.popular = create_recipes(reader, 3)[1:]
+        Cart.objects.bulk_create(
+            Cart(user=create_user(f'buyer{number}'), recipe=self.popular)
+            for number in range(3)
+        )
+        ShoppingListItem.objects.rebuild()
+
+    def delete(self, recipe):
+        client = APIClient()
+        client.force_authenticate(recipe.author)
+        with CaptureQueriesContext(connection) as captured:
+            response = client.delete(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 204)
+        call_command('rebuild_shopping_list', '--verify', stdout=StringIO())
+        table = ShoppingListItem._meta.db_table
+        return len([
+            query for query in captured if table in query['sql']
+        ])
+
+    def test_queries_do_not_depend_on_carts(self):
+        self.assertEqual(self.delete(self.recipe), self.delete(self.popular))
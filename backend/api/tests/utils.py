@@ -0,0 +1,45 @@
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, Tag)
+from users.models import Subscription, User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия', password='password')
+
+
+def create_recipes(user, count):
+    """
+    count рецептов двух авторов (на первого user подписан) с тэгами и
+    составом; часть рецептов у user в избранном и в корзине.
+    """
+    authors = [create_user(f'author{number}') for number in range(2)]
+    Subscription.objects.create(follower=user, author=authors[0])
+    tags = [
+        Tag.objects.create(
+            title=f'Тэг {number}', slug=f'tag{number}', color='#E26C2D')
+        for number in range(2)
+    ]
+    ingredients = [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(3)
+    ]
+    recipes = []
+    for number in range(count):
+        recipe = Recipe.objects.create(
+            author=authors[number % 2], name=f'Рецепт {number}',
+            image='recipes/test.jpg', text='Описание', cooking_time=10)
+        recipe.tags.set(tags)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe, ingredient=ingredient, amount=number + 1)
+            for ingredient in ingredients
+        )
+        if number % 2:
+            Favorite.objects.create(user=user, recipe=recipe)
+        if number % 3:
+            Cart.objects.create(user=user, recipe=recipe)
+        recipes.append(recipe)
+    return recipes
@@ -1,7 +1,8 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from .views import (CartView, FavoriteView, IngredientViewSet, RecipeViewSet,
+from .views import (BulkCartView, BulkFavoriteView, CartView, FavoriteView,
+                    IngredientViewSet, RecipeViewSet, ShoppingListView,
                     ShowSubscriptionsView, SubscribeView, TagViewSet,
                     UserViewSet, download_shopping_cart)
 
@@ -17,6 +18,21 @@ urlpatterns = [
         download_shopping_cart,
         name='download_shopping_cart'
     ),
+    path(
+        'recipes/shopping_list/',
+        ShoppingListView.as_view(),
+        name='shopping_list'
+    ),
+    path(
+        'recipes/favorite/',
+        BulkFavoriteView.as_view(),
+        name='favorite_bulk'
+    ),
+    path(
+        'recipes/shopping_cart/',
+        BulkCartView.as_view(),
+        name='shopping_cart_bulk'
+    ),
     path(
         'recipes/<int:id>/favorite/',
         FavoriteView.as_view(),
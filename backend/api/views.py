@@ -1,46 +1,220 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, FloatField,
+                              OuterRef, Prefetch, Subquery, Value, Window,
+                              prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
-from rest_framework.decorators import api_view
+from rest_framework.decorators import (action, api_view, permission_classes,
+                                       renderer_classes)
 from rest_framework.generics import ListAPIView
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from recipes.models import Cart, Favorite, Ingredient, Recipe, Tag
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingListItem, Tag)
 from users.models import Subscription, User
-from .filters import IngredientFilter, RecipeFilter
-from .mixins import CustomMixin
-from .pagination import CustomPagination
+from .cache import get_feed_cache_key
+from .catalog import cook_index
+from .filters import POPULAR_ORDERING, IngredientFilter, RecipeFilter
+from .lean import (IngredientLeanSerializer, RecipeLeanSerializer,
+                   TagLeanSerializer)
+from .mixins import AnonymousCacheMixin, BulkMixin, CustomMixin, LeanListMixin
+from .pagination import CustomPagination, KeysetPagination
 from .permissions import AdminOrReadOnly
-from .serializers import (CartSerializer, CreateRecipeSerializer,
-                          FavoriteSerializer, IngredientSerializer,
-                          RecipeIngredient, RecipeSerializer,
+from .renderers import (ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+                        ShoppingListTextRenderer)
+from .serializers import (CartSerializer, CookRecipeSerializer,
+                          CreateRecipeSerializer, FavoriteSerializer,
+                          IngredientSerializer, RecipeSerializer,
+                          ShoppingListItemSerializer,
                           ShowSubscriptionsSerializer, SubscriptionSerializer,
-                          TagSerializer, UserSerializer)
+                          TagSerializer, UserSerializer,
+                          get_ingredients_prefetch, get_recipes_limit)
 
+SHOPPING_LIST_CHUNK_SIZE = 2000
+FEED_ORDERING = ('-pub_date', '-id')
+COOK_MAX_INGREDIENTS = 100
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AnonymousCacheMixin, LeanListMixin,
+                    viewsets.ModelViewSet):
     """ Отображение рецептов. """
     permission_classes = [AllowAny, ]
     queryset = Recipe.objects.all().order_by('-pub_date')
     serializer_class = RecipeSerializer
+    lean_serializer_class = RecipeLeanSerializer
     pagination_class = CustomPagination
     filter_backends = [DjangoFilterBackend, ]
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_ordering(self):
+        """ Сортировка для ?cursor= (см. CustomPagination). """
+        if self.action in ('cook', 'feed', 'trending'):
+            # Рецепты упорядочены по совпадению или оценке популярности,
+            # курсор по дате к ним неприменим.
+            return None
+        if self.request.query_params.get('ordering') == 'popular':
+            return POPULAR_ORDERING
+        return ('-pub_date', '-id')
+
+    def get_queryset(self):
+        queryset = super().get_queryset().select_related(
+            'author'
+        ).prefetch_related('tags', get_ingredients_prefetch())
+        user = self.request.user
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(Cart.objects.filter(
+                user=user, recipe=OuterRef('pk')))
+        )
+
     def get_serializer_class(self):
+        if self.action == 'cook':
+            return CookRecipeSerializer
         if self.request.method == 'GET':
             return RecipeSerializer
         return CreateRecipeSerializer
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        """
+        Лента: рецепты авторов, на которых подписан пользователь, от новых
+        к старым, с постраничным выводом по ключу (?cursor=). Первая
+        страница без фильтров хранится в кэше пользователя (только id)
+        и сбрасывается, когда кто-то из его авторов публикует или удаляет
+        рецепт, а также при подписке и отписке.
+        """
+        paginator = KeysetPagination(
+            self.paginator.get_page_size(request), FEED_ORDERING)
+        key = None
+        if not request.query_params:
+            key = get_feed_cache_key(request.user.id)
+        cached = cache.get(key) if key else None
+        if cached is not None:
+            ids, has_more = cached
+            recipes = self.get_queryset().in_bulk(ids)
+            page = paginator.paginate_first_page(
+                [recipes[pk] for pk in ids if pk in recipes],
+                has_more, request, Recipe)
+        else:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                author__author__follower=request.user)
+            page = paginator.paginate_queryset(queryset, request, self)
+            if key:
+                cache.set(
+                    key,
+                    ([recipe.pk for recipe in page],
+                     paginator.next_row is not None),
+                    settings.FEED_CACHE_TIMEOUT)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False)
+    def trending(self, request):
+        """
+        Популярное за последние дни: рецепты по убыванию оценки из
+        TrendingScore (см. команду update_trending).
+        """
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trending__isnull=False
+        ).order_by('-trending__score', '-id')
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def with_coverage(queryset, ingredient_ids):
+        """
+        Рецепты, где есть хотя бы один из ингредиентов ingredient_ids,
+        с числом совпавших (matched) и долей совпавших (coverage) строк
+        состава. Кандидаты отбираются по индексу ingredient_id, общее
+        число строк считается по индексу (recipe_id, ingredient_id) только
+        для них, так что стоимость зависит от числа совпадений, а не от
+        размера каталога.
+        """
+        rows = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).order_by().values('recipe')
+        matched_rows = rows.filter(ingredient__in=ingredient_ids)
+        count = Count('pk')
+        return queryset.filter(id__in=RecipeIngredient.objects.filter(
+            ingredient__in=ingredient_ids).values('recipe')).annotate(
+            matched=Subquery(matched_rows.annotate(n=count).values('n')),
+            total=Subquery(rows.annotate(n=count).values('n')),
+            coverage=Cast('matched', FloatField()) / Cast(
+                'total', FloatField())
+        ).order_by('-coverage', '-matched', '-pub_date', '-id')
+
+    @action(detail=False)
+    def cook(self, request):
+        """
+        Что приготовить из имеющихся продуктов: ?ingredients=1,2,3.
+        Рецепты упорядочены по доле ингредиентов, которые уже есть.
+        """
+        values = ','.join(request.query_params.getlist('ingredients'))
+        try:
+            ingredient_ids = {
+                int(value) for value in values.split(',') if value.strip()
+            }
+        except ValueError:
+            ingredient_ids = None
+        if not ingredient_ids or len(ingredient_ids) > COOK_MAX_INGREDIENTS:
+            return Response({
+                'ingredients': (
+                    'Укажите от 1 до '
+                    f'{COOK_MAX_INGREDIENTS} id ингредиентов через запятую.'
+                )
+            }, status=status.HTTP_400_BAD_REQUEST)
+        filtered = any(
+            param in request.query_params
+            for param in RecipeFilter.base_filters
+        )
+        if settings.COOK_INDEX_IN_MEMORY and not filtered:
+            ranked = self.paginate_queryset(cook_index.rank(ingredient_ids))
+            recipes = self.get_queryset().in_bulk(
+                [recipe_id for recipe_id, _, _ in ranked])
+            page = []
+            for recipe_id, matched, coverage in ranked:
+                # Индекс другого процесса может ещё помнить удалённый рецепт.
+                if recipe_id in recipes:
+                    recipe = recipes[recipe_id]
+                    recipe.matched, recipe.coverage = matched, coverage
+                    page.append(recipe)
+        else:
+            page = self.paginate_queryset(self.with_coverage(
+                self.filter_queryset(self.get_queryset()), ingredient_ids))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
         return context
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Одним проходом по спискам покупок всех, у кого рецепт в корзине.
+        ShoppingListItem.objects.update_recipe(
+            instance,
+            dict(instance.recipe.values_list('ingredient_id', 'amount')),
+            {})
+        instance.delete()
+
 
 class UserViewSet(viewsets.ModelViewSet):
     """ Отображение пользователей. Регистрация нового пользователя. """
@@ -50,26 +224,28 @@ class UserViewSet(viewsets.ModelViewSet):
     pagination_class = CustomPagination
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(LeanListMixin, viewsets.ModelViewSet):
     """ Отображение тэгов. """
     permission_classes = [AdminOrReadOnly, ]
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    lean_serializer_class = TagLeanSerializer
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(LeanListMixin, viewsets.ModelViewSet):
     """ Отображение ингредиентов. """
     permission_classes = [AdminOrReadOnly, ]
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
+    lean_serializer_class = IngredientLeanSerializer
     filter_backends = [IngredientFilter, ]
-    search_fields = ['^name', ]
 
 
 class SubscribeView(APIView):
     """ Операция подписки/отписки. """
     permission_classes = [IsAuthenticated, ]
 
+    @transaction.atomic
     def post(self, request, id):
         data = {
             'follower': request.user.id,
@@ -83,6 +259,7 @@ class SubscribeView(APIView):
         serializer.save()
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete(self, request, id):
         author = get_object_or_404(User, id=id)
         subscription = get_object_or_404(
@@ -96,11 +273,45 @@ class ShowSubscriptionsView(ListAPIView):
     """ Отображение подписок. """
     permission_classes = [IsAuthenticated, ]
     pagination_class = CustomPagination
+    cursor_ordering = ('username', 'id')
+
+    @staticmethod
+    def get_recipes_queryset(authors, limit):
+        """
+        Рецепты авторов страницы; при limit — только первые limit рецептов
+        каждого автора, отобранные ROW_NUMBER() OVER (PARTITION BY author)
+        одним запросом.
+        """
+        queryset = Recipe.objects.order_by('-pub_date')
+        if limit is None or not authors:
+            return queryset
+        ranked = Recipe.objects.filter(author__in=authors).annotate(
+            recipe_rank=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=F('pub_date').desc()
+            )
+        ).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE recipe_rank <= %s',
+            (*params, limit)
+        ))
 
     def get(self, request):
         follower = request.user
-        queryset = User.objects.filter(author__follower=follower)
+        queryset = User.objects.filter(
+            author__follower=follower
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('username')
         page = self.paginate_queryset(queryset)
+        prefetch_related_objects(page, Prefetch(
+            'recipes',
+            queryset=self.get_recipes_queryset(
+                page, get_recipes_limit(request)),
+            to_attr='prefetched_recipes'
+        ))
         serializer = ShowSubscriptionsSerializer(
             page, many=True, context={'request': request}
         )
@@ -112,6 +323,7 @@ class FavoriteView(CustomMixin, APIView):
     permission_classes = [IsAuthenticated, ]
     serializer_class = FavoriteSerializer
     model_class = Favorite
+    counter_field = 'favorites_count'
 
 
 class CartView(CustomMixin, APIView):
@@ -119,23 +331,74 @@ class CartView(CustomMixin, APIView):
     permission_classes = [IsAuthenticated, ]
     serializer_class = CartSerializer
     model_class = Cart
+    counter_field = 'carts_count'
+
+    def added(self, instance):
+        ShoppingListItem.objects.add_recipe(instance.user, instance.recipe)
+
+    def removed(self, user, recipe_id):
+        ShoppingListItem.objects.remove_recipes(user, [recipe_id])
+
+
+class BulkFavoriteView(BulkMixin, APIView):
+    """ Добавить/удалить несколько рецептов из избранного. """
+    permission_classes = [IsAuthenticated, ]
+    model_class = Favorite
+    counter_field = 'favorites_count'
+
+
+class BulkCartView(BulkMixin, APIView):
+    """ Добавить/удалить несколько рецептов из списка покупок. """
+    permission_classes = [IsAuthenticated, ]
+    model_class = Cart
+    counter_field = 'carts_count'
+
+    def added_many(self, user, recipe_ids):
+        ShoppingListItem.objects.add_recipes(user, recipe_ids)
+
+    def removed_many(self, user, recipe_ids):
+        ShoppingListItem.objects.remove_recipes(user, recipe_ids)
+
+
+class ShoppingListView(ListAPIView):
+    """ Список покупок пользователя в JSON. """
+    permission_classes = [IsAuthenticated, ]
+    serializer_class = ShoppingListItemSerializer
+
+    def get_queryset(self):
+        return ShoppingListItem.objects.filter(
+            user=self.request.user
+        ).select_related('ingredient').order_by('ingredient__name')
 
 
 @api_view(['GET'])
+@permission_classes([IsAuthenticated, ])
+@renderer_classes([
+    ShoppingListTextRenderer,
+    ShoppingListCSVRenderer,
+    ShoppingListJSONRenderer,
+])
 def download_shopping_cart(request):
-    ingredient_list = "Cписок покупок:"
-    ingredients = RecipeIngredient.objects.filter(
-        recipe__cart__user=request.user
+    """
+    Скачать список покупок: ?format=txt|csv|json.
+
+    Строки агрегата ShoppingListItem читаются из базы порциями и сразу
+    отдаются клиенту.
+    """
+    rows = ShoppingListItem.objects.filter(
+        user=request.user
     ).values(
-        'ingredient__name',
-        'ingredient__measurement_unit'
-    ).annotate(total=Sum('amount')).order_by('ingredient__name')
-    for ingredient in ingredients:
-        ingredient_list += (
-          f"\n{ingredient['ingredient__name']} - "
-          f"{ingredient['total']} {ingredient['ingredient__measurement_unit']}"
-        )
-    file = 'shopping_list.txt'
-    response = HttpResponse(ingredient_list, content_type='text/plain')
-    response['Content-Disposition'] = f'attachment; filename={file}'
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+        amount=F('total')
+    ).order_by('ingredient__name').iterator(
+        chunk_size=SHOPPING_LIST_CHUNK_SIZE)
+    renderer = request.accepted_renderer
+    response = StreamingHttpResponse(
+        renderer.stream(rows),
+        content_type=f'{renderer.media_type}; charset={renderer.charset}'
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename={renderer.get_filename()}'
+    )
     return response
@@ -29,6 +29,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.QueryTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -104,16 +105,96 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
+# Кэш ответов, версия рецептов и ленты сбрасываются сигналами в процессе,
+# который изменил данные, поэтому кэш должен быть общим для всех
+# процессов gunicorn: по умолчанию таблица в базе (manage.py
+# createcachetable), можно указать Memcached. LocMemCache годится только
+# для одного процесса (разработка).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.db.DatabaseCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram_cache'),
+    }
+}
+
+RECIPES_CACHE_TIMEOUT = int(os.getenv('RECIPES_CACHE_TIMEOUT', 60 * 5))
+FEED_CACHE_TIMEOUT = int(os.getenv('FEED_CACHE_TIMEOUT', 60 * 5))
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 * 1024)
+)
+IMAGE_RENDITION_BACKEND = os.getenv(
+    'IMAGE_RENDITION_BACKEND', 'recipes.images.ThreadPoolBackend'
+)
+IMAGE_RENDITION_WORKERS = int(os.getenv('IMAGE_RENDITION_WORKERS', 2))
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Кэш токенов для api.authentication.CachedTokenAuthentication:
+# время жизни записи, число записей в памяти процесса и необязательный
+# псевдоним общего кэша из CACHES (пусто — только память процесса).
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_BACKEND = os.getenv('TOKEN_CACHE_BACKEND', '')
+
+# Списки рецептов, тэгов и ингредиентов через .values() без полей DRF
+# (см. api.lean).
+LEAN_READ_PATH = os.getenv('LEAN_READ_PATH', 'False') == 'True'
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 50))
+INGREDIENT_SEARCH_IN_MEMORY = (
+    os.getenv('INGREDIENT_SEARCH_IN_MEMORY', 'False') == 'True'
+)
+INGREDIENT_SEARCH_CACHE_TTL = int(
+    os.getenv('INGREDIENT_SEARCH_CACHE_TTL', 300)
+)
+TAG_CATALOG_TTL = int(os.getenv('TAG_CATALOG_TTL', 300))
+# recipes/cook/ по индексу в памяти отвечает за десятки миллисекунд даже
+# на 100 ингредиентах, SQL-путь на 20 тыс. рецептов — за сотни
+# (benchmark_api). Индекс на 100 тыс. рецептов занимает несколько
+# мегабайт в каждом процессе.
+COOK_INDEX_IN_MEMORY = os.getenv('COOK_INDEX_IN_MEMORY', 'True') == 'True'
+COOK_INDEX_TTL = int(os.getenv('COOK_INDEX_TTL', 300))
+# Как часто (в секундах) справочники в памяти процесса (api.catalog)
+# сверяют свою версию с общим кэшем, чтобы увидеть правки других
+# процессов.
+CATALOG_VERSION_CHECK_INTERVAL = float(
+    os.getenv('CATALOG_VERSION_CHECK_INTERVAL', 1)
+)
+
+TRENDING_DAYS = int(os.getenv('TRENDING_DAYS', 7))
+TRENDING_HALF_LIFE_HOURS = int(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+
+# Доля запросов (0..1), для которых api.middleware.QueryTimingMiddleware
+# считает обращения к базе; 0 отключает подсчёт.
+QUERY_TIMING_SAMPLE_RATE = float(os.getenv('QUERY_TIMING_SAMPLE_RATE', 0))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.timing': {'handlers': ['console'], 'level': 'INFO'},
+    },
 }
 
 DJOSER = {
@@ -1,7 +1,8 @@
 from django.contrib import admin
 from rest_framework.authtoken.admin import TokenAdmin
 
-from .models import Cart, Favorite, Ingredient, Recipe, RecipeIngredient, Tag
+from .models import (Cart, Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingListItem, Tag)
 
 TokenAdmin.raw_id_fields = ['user']
 
@@ -18,14 +19,12 @@ class LinksAdmin(admin.ModelAdmin):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('id', 'name', 'author', 'favorites')
+    list_display = ('id', 'name', 'author', 'favorites_count', 'carts_count')
     search_fields = ('name', 'author__username')
     list_filter = ('tags',)
+    list_select_related = ('author',)
     inlines = (IngredientInLine,)
 
-    def favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -48,3 +47,9 @@ class CartAdmin(admin.ModelAdmin):
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
     search_fields = ('user__username', 'user__email')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'ingredient', 'total')
+    search_fields = ('user__username', 'user__email')
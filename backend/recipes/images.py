@@ -0,0 +1,140 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+# Поле модели -> наибольшая сторона уменьшенной копии в пикселях.
+RENDITIONS = {
+    'image_thumb': 320,
+    'image_medium': 960,
+}
+
+
+def render_image(file, size):
+    """ Уменьшает изображение и кодирует его в WebP (или JPEG). """
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size), Image.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        buffer = io.BytesIO()
+        if features.check('webp'):
+            extension = 'webp'
+            image.save(buffer, 'WEBP', quality=80, method=4)
+        else:
+            extension = 'jpg'
+            image.convert('RGB').save(
+                buffer, 'JPEG', quality=80, optimize=True, progressive=True)
+    return buffer.getvalue(), extension
+
+
+def make_renditions(recipe_id):
+    """
+    Строит уменьшенные копии фотографии рецепта и сохраняет их в поля
+    RENDITIONS. Если фотографию успели заменить, результат отбрасывается.
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.filter(pk=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    base = os.path.splitext(os.path.basename(source))[0]
+    files = {}
+    for field, size in RENDITIONS.items():
+        with recipe.image.open('rb') as file:
+            content, extension = render_image(file, size)
+        files[field] = ContentFile(content, name=f'{base}.{extension}')
+    with transaction.atomic():
+        recipe = (
+            Recipe.objects.select_for_update()
+            .filter(pk=recipe_id, image=source).first()
+        )
+        if recipe is None:
+            return
+        for field, content in files.items():
+            getattr(recipe, field).save(content.name, content, save=False)
+        recipe.save(update_fields=list(files))
+
+
+def run_task(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Не удалось обработать изображение: %s', args)
+
+
+def run_worker_task(func, *args):
+    # Поток пула держит свои соединения между задачами и закрывает
+    # устаревшие, как это делается после запроса. SyncBackend так
+    # не делает: его соединение принадлежит текущему запросу.
+    close_old_connections()
+    try:
+        run_task(func, *args)
+    finally:
+        close_old_connections()
+
+
+class SyncBackend:
+    """ Выполняет задачу сразу, в текущем потоке (для разработки). """
+
+    def submit(self, func, *args):
+        run_task(func, *args)
+
+
+class ThreadPoolBackend:
+    """
+    Локальная очередь с пулом потоков внутри процесса веб-сервера.
+    Pillow отпускает GIL при декодировании и масштабировании, поэтому
+    потоков достаточно. Для Celery достаточно написать бэкенд
+    с тем же методом submit().
+    """
+
+    def __init__(self, max_workers=None):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.IMAGE_RENDITION_WORKERS,
+            thread_name_prefix='renditions')
+
+    def submit(self, func, *args):
+        self.executor.submit(run_worker_task, func, *args)
+
+
+@lru_cache(maxsize=None)
+def get_backend():
+    return import_string(settings.IMAGE_RENDITION_BACKEND)()
+
+
+def discard_renditions(recipe):
+    """
+    Очищает поля RENDITIONS (копии прежней фотографии) и удаляет их
+    файлы после фиксации транзакции.
+    """
+    files = [
+        (file.storage, file.name)
+        for file in (getattr(recipe, field) for field in RENDITIONS)
+        if file
+    ]
+    for field in RENDITIONS:
+        setattr(recipe, field, '')
+
+    def delete_files():
+        for storage, name in files:
+            storage.delete(name)
+
+    transaction.on_commit(delete_files)
+
+
+def schedule_renditions(recipe):
+    """ Ставит построение копий в очередь после фиксации транзакции. """
+    recipe_id = recipe.pk
+    transaction.on_commit(
+        lambda: get_backend().submit(make_renditions, recipe_id))
@@ -0,0 +1,292 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.models import (Cart, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingListItem, Tag,
+                            TrendingScore)
+from recipes.search import reindex_recipes
+from users.models import Subscription, User
+from .load_ingredients import DEFAULT_PATH
+
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+    ('Десерт', 'dessert', '#F4A7BB'),
+    ('Выпечка', 'bakery', '#C28F5C'),
+    ('Салат', 'salad', '#7CB342'),
+    ('Суп', 'soup', '#FFB300'),
+    ('Напиток', 'drink', '#29B6F6'),
+)
+FAKE_IMAGE = 'recipes/fake.jpg'
+
+
+class PowerLaw:
+    """
+    Выбор элементов с вероятностью ~ 1 / rank ** alpha: немногие авторы
+    и рецепты собирают большую часть подписок, избранного и корзин.
+    Ранги раздаются в случайном порядке, а не по возрастанию id.
+    """
+
+    def __init__(self, rng, items, alpha):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** alpha for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, k, exclude=None):
+        """ k разных элементов, кроме exclude (не больше половины всех). """
+        k = min(k, (len(self.items) - 1) // 2)
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.rng.choices(
+                self.items, cum_weights=self.cum_weights, k=k - len(chosen)))
+            chosen.discard(exclude)
+        return chosen
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт синтетические данные для нагрузочного тестирования: '
+        'пользователей, рецепты с ингредиентами и тэгами, подписки, '
+        'избранное и корзины со степенным распределением популярности. '
+        'Одинаковый --seed даёт одинаковый набор данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Сколько пользователей создать.')
+        parser.add_argument(
+            '--recipes', type=int, default=10000,
+            help='Сколько рецептов создать.')
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок на пользователя.')
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число рецептов в избранном у пользователя.')
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Среднее число рецептов в корзине у пользователя.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения популярности.')
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней разбросать даты публикаций и добавлений.')
+        parser.add_argument(
+            '--ingredients', default=DEFAULT_PATH,
+            help='Файл для load_ingredients, если ингредиентов ещё нет.')
+        parser.add_argument(
+            '--password', default='password',
+            help='Пароль всех созданных пользователей.')
+        parser.add_argument(
+            '--seed', type=int, default=42,
+            help='Зерно генератора случайных чисел.')
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Размер пачки для bulk_create.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 2 or options['recipes'] < 1:
+            raise CommandError('Нужно хотя бы 2 пользователя и 1 рецепт.')
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.period = options['days'] * 24 * 60 * 60
+        started = time.monotonic()
+        with transaction.atomic():
+            ingredient_ids = self.get_ingredients(options['ingredients'])
+            tag_ids = self.get_tags()
+            user_ids = self.create_users(
+                options['users'], options['password'])
+            authors = PowerLaw(self.rng, user_ids, options['alpha'])
+            recipe_ids = self.create_recipes(
+                options['recipes'], authors, ingredient_ids, tag_ids)
+            recipes = PowerLaw(self.rng, recipe_ids, options['alpha'])
+            self.report('Подписки', self.create_links(
+                Subscription, 'follower', 'author', user_ids, authors,
+                options['subscriptions'], dated=False, exclude_owner=True))
+            self.report('Избранное', self.create_links(
+                Favorite, 'user', 'recipe', user_ids, recipes,
+                options['favorites']))
+            self.report('Корзины', self.create_links(
+                Cart, 'user', 'recipe', user_ids, recipes,
+                options['carts']))
+            self.stdout.write('Пересчёт производных данных...')
+            call_command('reconcile_counters', stdout=self.stdout)
+            ShoppingListItem.objects.rebuild()
+            TrendingScore.objects.refresh(full=True)
+            reindex_recipes()
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.monotonic() - started:.1f} с.'))
+
+    def report(self, title, count):
+        self.stdout.write(f'{title}: {count}')
+
+    def random_date(self):
+        return self.now - timedelta(seconds=self.rng.random() * self.period)
+
+    def bulk_insert(self, model, objs):
+        """ Пачками вставляет objs; возвращает число строк. """
+        count = 0
+        while True:
+            batch = list(islice(objs, self.batch_size))
+            if not batch:
+                return count
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            count += len(batch)
+
+    def bulk_insert_ids(self, model, objs):
+        """ Как bulk_insert, но возвращает id новых строк по порядку. """
+        # SQLite в Django 3.2 не возвращает id из bulk_create, поэтому они
+        # читаются после вставки.
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        count = self.bulk_insert(model, objs)
+        return list(model.objects.filter(id__gt=last_id).order_by(
+            'id').values_list('id', flat=True)[:count])
+
+    def get_ingredients(self, path):
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', path, stdout=self.stdout)
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError('Нет ингредиентов для рецептов.')
+        return ingredient_ids
+
+    def get_tags(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(title=title, slug=slug, color=color)
+                for title, slug, color in TAGS
+            ],
+            ignore_conflicts=True
+        )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def create_users(self, count, password):
+        password = make_password(password)
+        prefix = f'fake{User.objects.count()}_'
+        users = (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password
+            )
+            for number in range(count)
+        )
+        user_ids = self.bulk_insert_ids(User, users)
+        self.report('Пользователи', len(user_ids))
+        return user_ids
+
+    def create_recipes(self, count, authors, ingredient_ids, tag_ids):
+        names = dict(Ingredient.objects.values_list('id', 'name'))
+        recipe_ids = []
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            compositions = [
+                self.rng.sample(
+                    ingredient_ids,
+                    min(len(ingredient_ids),
+                        max(1, round(self.rng.gauss(8, 3)))))
+                for _ in range(size)
+            ]
+            recipes = [
+                Recipe(
+                    author_id=authors.choice(),
+                    name=self.recipe_name(names, composition),
+                    image=FAKE_IMAGE,
+                    text='Понадобится: ' + ', '.join(
+                        names[ingredient_id]
+                        for ingredient_id in composition) + '.',
+                    cooking_time=self.rng.randint(5, 180)
+                )
+                for composition in compositions
+            ]
+            batch_ids = self.bulk_insert_ids(Recipe, iter(recipes))
+            # pub_date (auto_now_add) при вставке получает текущее время,
+            # поэтому случайные даты публикации проставляются после неё.
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(id=recipe_id, pub_date=self.random_date())
+                    for recipe_id in batch_ids
+                ],
+                ['pub_date'],
+                batch_size=self.batch_size
+            )
+            RecipeIngredient.objects.bulk_create(
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient_id=ingredient_id,
+                        amount=self.rng.randint(1, 500)
+                    )
+                    for recipe_id, composition in zip(batch_ids, compositions)
+                    for ingredient_id in composition
+                ),
+                batch_size=self.batch_size
+            )
+            Recipe.tags.through.objects.bulk_create(
+                (
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+                    for recipe_id in batch_ids
+                    for tag_id in self.rng.sample(
+                        tag_ids, self.rng.randint(1, min(3, len(tag_ids))))
+                ),
+                batch_size=self.batch_size
+            )
+            recipe_ids.extend(batch_ids)
+            created += size
+            self.stdout.write(f'Рецепты: {created}/{count}')
+        return recipe_ids
+
+    def recipe_name(self, names, composition):
+        first = names[composition[0]].capitalize()
+        if len(composition) == 1:
+            return first[:200]
+        return f'{first} с {names[composition[1]]}'[:200]
+
+    def create_links(self, model, owner_field, target_field, owner_ids,
+                     targets, mean, dated=True, exclude_owner=False):
+        """
+        Для каждого владельца выбирает в среднем mean целей по степенному
+        закону и пачками вставляет строки model.
+        dated: заполнять ли поле created.
+        exclude_owner: цели — тоже пользователи, и владелец не выбирает
+        сам себя (подписки).
+        """
+        def objs():
+            for owner_id in owner_ids:
+                count = round(self.rng.expovariate(1 / mean)) if mean else 0
+                chosen = targets.sample(
+                    count, exclude=owner_id if exclude_owner else None)
+                for target_id in sorted(chosen):
+                    fields = {
+                        f'{owner_field}_id': owner_id,
+                        f'{target_field}_id': target_id,
+                    }
+                    if dated:
+                        fields['created'] = self.random_date()
+                    yield model(**fields)
+
+        return self.bulk_insert(model, objs())
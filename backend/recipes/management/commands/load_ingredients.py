@@ -0,0 +1,157 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipes.models import Ingredient
+
+DEFAULT_PATH = os.path.join(
+    settings.BASE_DIR, '..', 'data', 'ingredients.csv')
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) < 2 or row[:2] == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+def read_json(file, chunk_size=64 * 1024):
+    """
+    Читает JSON-массив ингредиентов по частям, не загружая файл целиком.
+    Понимает как простые объекты {name, measurement_unit}, так и формат
+    фикстур Django ({model, pk, fields}).
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидался JSON-массив ингредиентов.')
+    position = 1
+    while True:
+        position = JSON_SEPARATORS.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON оборван или повреждён.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        item = item.get('fields', item)
+        yield item['name'], item['measurement_unit']
+
+
+class CSVStream:
+    """ Файлоподобная обёртка над строками для COPY ... FROM STDIN. """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def read(self, size=-1):
+        while size < 0 or self.buffer.tell() < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        data = self.buffer.getvalue()
+        if size < 0:
+            size = len(data)
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        self.buffer.write(data[size:])
+        return data[:size]
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает ингредиенты из CSV (name,measurement_unit) или JSON. '
+        'Уже существующие пары (name, measurement_unit) пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к .csv или .json файлу.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Размер пачки для bulk_create.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        extension = os.path.splitext(path)[1].lower()
+        readers = {'.csv': read_csv, '.json': read_json}
+        if extension not in readers:
+            raise CommandError('Поддерживаются только файлы .csv и .json.')
+        started = time.monotonic()
+        existing = set(
+            Ingredient.objects.values_list('name', 'measurement_unit'))
+        stats = {'read': 0, 'new': 0}
+
+        def new_rows(rows):
+            for name, measurement_unit in rows:
+                stats['read'] += 1
+                key = (name.strip(), measurement_unit.strip())
+                if key in existing:
+                    continue
+                existing.add(key)
+                stats['new'] += 1
+                yield key
+
+        with open(path, encoding='utf-8', newline='') as file:
+            with transaction.atomic():
+                rows = new_rows(readers[extension](file))
+                if connection.vendor == 'postgresql':
+                    self.copy(rows)
+                else:
+                    self.bulk_create(rows, options['batch_size'])
+        elapsed = max(time.monotonic() - started, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Прочитано {stats["read"]}, добавлено {stats["new"]} '
+            f'ингредиентов за {elapsed:.2f} с '
+            f'({stats["read"] / elapsed:.0f} строк/с).'))
+
+    def bulk_create(self, rows, batch_size):
+        objs = (
+            Ingredient(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in rows
+        )
+        while True:
+            batch = list(islice(objs, batch_size))
+            if not batch:
+                return
+            Ingredient.objects.bulk_create(
+                batch, batch_size=batch_size, ignore_conflicts=True)
+
+    def copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(10)) '
+                'ON COMMIT DROP')
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                CSVStream(rows))
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT name, measurement_unit FROM ingredient_import '
+                'ON CONFLICT DO NOTHING')
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает агрегат списков покупок (ShoppingListItem) по '
+        'корзинам пользователей или, с --verify, сверяет его с ними.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только сверить агрегат, ничего не изменяя.')
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users',
+            help='ID пользователя (можно указать несколько раз).')
+
+    def handle(self, *args, **options):
+        users = options['users']
+        if not options['verify']:
+            ShoppingListItem.objects.rebuild(users)
+            self.stdout.write(self.style.SUCCESS(
+                'Списки покупок пересобраны.'))
+            return
+        stored = ShoppingListItem.objects.all()
+        if users is not None:
+            stored = stored.filter(user__in=users)
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in stored.values_list(
+                'user', 'ingredient', 'total')
+        }
+        live = ShoppingListItem.objects.live_totals(users)
+        mismatches = [
+            (key, stored.get(key), live.get(key))
+            for key in sorted({*stored, *live})
+            if stored.get(key) != live.get(key)
+        ]
+        for (user_id, ingredient_id), saved, expected in mismatches:
+            self.stdout.write(
+                f'user={user_id} ingredient={ingredient_id}: '
+                f'в агрегате {saved}, по корзине {expected}')
+        if mismatches:
+            raise CommandError(
+                f'Расхождений: {len(mismatches)}. '
+                'Запустите команду без --verify, чтобы пересобрать агрегат.')
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Cart, Favorite, Recipe
+from users.models import Subscription, User
+
+
+def count_of(model, field):
+    """ Подзапрос: число строк model, ссылающихся через field на запись. """
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(n=Count('pk')).values('n')
+    ), 0)
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', Cart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет счётчики (favorites_count, carts_count, recipes_count, '
+        'followers_count) с таблицами и исправляет расхождения.'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                actual = count_of(related_model, related_field)
+                fixed = model.objects.exclude(**{field: actual}).update(
+                    **{field: actual})
+                self.stdout.write(
+                    f'{model._meta.model_name}.{field}: '
+                    f'исправлено {fixed}')
+        self.stdout.write(self.style.SUCCESS('Счётчики сверены.'))
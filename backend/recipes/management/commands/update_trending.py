@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import TrendingScore
+
+
+class Command(BaseCommand):
+    help = (
+        'Обновляет оценки популярности рецептов (TrendingScore). '
+        'Запускается периодически, например из cron раз в 10 минут.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать оценки с нуля, а не инкрементально.')
+
+    def handle(self, *args, **options):
+        count = TrendingScore.objects.refresh(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Оценки популярности обновлены, рецептов: {count}.'))
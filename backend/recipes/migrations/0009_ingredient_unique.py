@@ -0,0 +1,65 @@
+# Generated by Django 3.2.16 on 2026-10-18 03:57
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+# Модели со ссылкой на ингредиент: (модель, владелец строки, количество).
+INGREDIENT_ROWS = (
+    ('RecipeIngredient', 'recipe_id', 'amount'),
+    ('ShoppingListItem', 'user_id', 'total'),
+)
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Сливает ингредиенты с одинаковыми названием и единицей измерения в
+    ингредиент с наименьшим id. Строки составов рецептов и списков
+    покупок переносятся на него; если у рецепта (пользователя) уже есть
+    строка с ним, количества складываются.
+    """
+    ingredient = apps.get_model('recipes', 'Ingredient')
+    groups = ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(keep=Min('id'), copies=Count('id')).filter(copies__gt=1)
+    for group in groups:
+        keep = group['keep']
+        duplicates = list(ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit']
+        ).exclude(id=keep).values_list('id', flat=True))
+        for model_name, owner, amount in INGREDIENT_ROWS:
+            model = apps.get_model('recipes', model_name)
+            for row in model.objects.filter(ingredient_id__in=duplicates):
+                target = model.objects.filter(
+                    **{owner: getattr(row, owner)}, ingredient_id=keep
+                ).first()
+                if target is None:
+                    row.ingredient_id = keep
+                    row.save(update_fields=['ingredient'])
+                    continue
+                setattr(
+                    target, amount,
+                    getattr(target, amount) + getattr(row, amount))
+                target.save(update_fields=[amount])
+                row.delete()
+        ingredient.objects.filter(id__in=duplicates).delete()
+    # PostgreSQL откладывает проверки внешних ключей до конца транзакции,
+    # а ALTER TABLE из AddConstraint в той же транзакции не выполнится,
+    # пока они не проверены.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+INDEXES = (
+    (
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix '
+        'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)',
+        'DROP INDEX IF EXISTS recipes_ingredient_name_prefix',
+    ),
+    (
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+        'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+        'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+    ),
+)
+
+
+def create_indexes(apps, schema_editor):
+    # Индексы под UPPER(name) LIKE 'X%' / '%X%', которые Django строит
+    # для istartswith/icontains. Нужны только на PostgreSQL.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for create_sql, _ in INDEXES:
+        schema_editor.execute(create_sql)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for _, drop_sql in INDEXES:
+        schema_editor.execute(drop_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_ingredient_unique'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,63 @@
+from django.db import migrations
+
+FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_CONFIG = 'russian'
+
+POSTGRESQL = (
+    (
+        'ALTER TABLE recipes_recipe ADD COLUMN IF NOT EXISTS search_vector '
+        'tsvector GENERATED ALWAYS AS ('
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(name, '')), 'A')"
+        ' || '
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(text, '')), 'B')"
+        ') STORED',
+        'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector',
+    ),
+    (
+        'CREATE INDEX IF NOT EXISTS recipes_recipe_search_vector '
+        'ON recipes_recipe USING gin (search_vector)',
+        'DROP INDEX IF EXISTS recipes_recipe_search_vector',
+    ),
+)
+SQLITE = (
+    (
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+        'USING fts5(name, text)',
+        f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    ),
+    (
+        f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+        'SELECT id, name, text FROM recipes_recipe',
+        None,
+    ),
+)
+
+
+def get_statements(schema_editor):
+    # Генерируемый столбец требует PostgreSQL 12+, FTS5 — SQLite 3.9+.
+    return {
+        'postgresql': POSTGRESQL,
+        'sqlite': SQLITE,
+    }.get(schema_editor.connection.vendor, ())
+
+
+def create_search(apps, schema_editor):
+    for create_sql, _ in get_statements(schema_editor):
+        schema_editor.execute(create_sql)
+
+
+def drop_search(apps, schema_editor):
+    for _, drop_sql in reversed(get_statements(schema_editor)):
+        if drop_sql:
+            schema_editor.execute(drop_sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_author_pub_date_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search, drop_search),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:15
+
+from datetime import datetime, timezone
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+UNKNOWN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+def mark_existing(apps, schema_editor):
+    # Время добавления старых записей неизвестно: пусть они не попадают
+    # в окно популярности, а не выглядят добавленными в момент миграции.
+    for name in ('Cart', 'Favorite'):
+        apps.get_model('recipes', name).objects.update(created=UNKNOWN)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trending', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('score', models.FloatField(verbose_name='Оценка')),
+                ('computed_at', models.DateTimeField(verbose_name='Пересчитано')),
+            ],
+            options={
+                'verbose_name': 'Оценка популярности',
+                'verbose_name_plural': 'Оценки популярности',
+            },
+        ),
+        migrations.AddField(
+            model_name='cart',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Добавлен'),
+        ),
+        migrations.AddIndex(
+            model_name='trendingscore',
+            index=models.Index(fields=['-score', '-recipe'], name='trending_score_idx'),
+        ),
+        migrations.RunPython(mark_existing, migrations.RunPython.noop),
+    ]
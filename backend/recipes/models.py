@@ -1,7 +1,11 @@
+from datetime import timedelta
+
 from colorfield.fields import ColorField
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -28,6 +32,12 @@ class Ingredient(models.Model):
         verbose_name = 'ингредиент'
         verbose_name_plural = 'ингредиенты'
         ordering = ['name']
+        constraints = (
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient'
+            ),
+        )
 
     def __str__(self):
         return str(self.name)
@@ -41,6 +51,11 @@ class Recipe(models.Model):
         verbose_name='Автор рецепта')
     name = models.CharField('Название рецепта', max_length=200)
     image = models.ImageField('Фотография блюда', upload_to='recipes/')
+    image_thumb = models.ImageField(
+        'Миниатюра', upload_to='recipes/thumbs/', blank=True, editable=False)
+    image_medium = models.ImageField(
+        'Уменьшенная фотография', upload_to='recipes/medium/',
+        blank=True, editable=False)
     text = models.TextField('Описание рецепта')
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -55,11 +70,29 @@ class Recipe(models.Model):
         validators=[MinValueValidator(1)],
         verbose_name='Время приготовления в минутах')
     pub_date = models.DateTimeField('Дата публикации', auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False)
+    carts_count = models.PositiveIntegerField(
+        'В списках покупок', default=0, editable=False)
 
     class Meta:
         verbose_name = 'рецепт'
         verbose_name_plural = 'рецепты'
         ordering = ['-pub_date']
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx'
+            ),
+        )
 
     def __str__(self):
         return self.name
@@ -85,6 +118,78 @@ class RecipeIngredient(models.Model):
         return f'{self.ingredient}, {self.amount}'
 
 
+class UserRecipeManager(models.Manager):
+    """
+    Менеджер связей пользователь — рецепт (корзина, избранное).
+
+    Связи добавляются одним INSERT ... ON CONFLICT DO NOTHING (на SQLite
+    INSERT OR IGNORE): повтор
+    отсекает уникальное ограничение (user, recipe), а база сообщает,
+    какие строки она действительно добавила. Счётчики и список покупок
+    обновляются только по ним, поэтому одиночный и массовый запросы
+    с одним рецептом не учитывают его дважды.
+    """
+
+    def add(self, user, recipe_ids):
+        """
+        Добавляет связи user с рецептами recipe_ids, которых ещё нет.
+        Возвращает {id рецепта: id новой строки} только для добавленных.
+        """
+        if not recipe_ids:
+            return {}
+        connection = connections[self.db]
+        ops = connection.ops
+        opts = self.model._meta
+        user_field, recipe_field, created_field = (
+            opts.get_field(name) for name in ('user', 'recipe', 'created'))
+        created = created_field.get_db_prep_save(timezone.now(), connection)
+        rows = [(user.id, recipe_id, created) for recipe_id in recipe_ids]
+        insert = ops.insert_statement(ignore_conflicts=True)
+        table = ops.quote_name(opts.db_table)
+        columns = ', '.join(
+            ops.quote_name(field.column)
+            for field in (user_field, recipe_field, created_field))
+        on_conflict = ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)
+
+        def statement(count):
+            values = ', '.join(['(%s, %s, %s)'] * count)
+            return (
+                f'{insert} {table} ({columns}) VALUES {values} {on_conflict}')
+
+        with connection.cursor() as cursor:
+            if connection.features.can_return_rows_from_bulk_insert:
+                pk_column = ops.quote_name(opts.pk.column)
+                recipe_column = ops.quote_name(recipe_field.column)
+                cursor.execute(
+                    f'{statement(len(rows))} '
+                    f'RETURNING {pk_column}, {recipe_column}',
+                    [value for row in rows for value in row])
+                return {recipe_id: pk for pk, recipe_id in cursor.fetchall()}
+            # Без RETURNING о добавлении говорит только rowcount, поэтому
+            # строки вставляются по одной.
+            added = {}
+            with transaction.atomic(using=self.db, savepoint=False):
+                for row in rows:
+                    cursor.execute(statement(1), row)
+                    if cursor.rowcount == 1:
+                        added[row[1]] = cursor.lastrowid
+            return added
+
+    def remove(self, user, recipe_ids):
+        """
+        Удаляет связи user с рецептами recipe_ids. Возвращает id
+        рецептов, связи с которыми удалены этим вызовом: строки
+        блокируются, и параллельный запрос их уже не увидит.
+        """
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = dict(self.select_for_update().filter(
+                user=user, recipe__in=recipe_ids
+            ).values_list('id', 'recipe_id'))
+            if rows:
+                self.filter(id__in=rows).delete()
+        return list(rows.values())
+
+
 class Cart(models.Model):
     user = models.ForeignKey(
         User,
@@ -96,6 +201,10 @@ class Cart(models.Model):
         related_name='cart',
         on_delete=models.CASCADE,
         verbose_name='Рецепт в списке покупок')
+    created = models.DateTimeField(
+        'Добавлен', default=timezone.now, db_index=True)
+
+    objects = UserRecipeManager()
 
     class Meta:
         ordering = ['-id']
@@ -119,6 +228,10 @@ class Favorite(models.Model):
         related_name='favorite',
         on_delete=models.CASCADE,
         verbose_name='Рецепт в избранном')
+    created = models.DateTimeField(
+        'Добавлен', default=timezone.now, db_index=True)
+
+    objects = UserRecipeManager()
 
     class Meta:
         ordering = ['user']
@@ -130,3 +243,251 @@ class Favorite(models.Model):
                 name='unique_for_favorite'
             ),
         )
+
+
+class ShoppingListManager(models.Manager):
+    """
+    Поддерживает агрегат списка покупок в актуальном состоянии.
+
+    Вместо пересчёта Sum('amount') по корзине при каждом скачивании
+    изменения количеств применяются к таблице ShoppingListItem в момент
+    добавления/удаления рецепта из корзины или правки его ингредиентов.
+    """
+
+    def add_recipe(self, user, recipe):
+        self.add_recipes(user, [recipe.id])
+
+    def remove_recipe(self, user, recipe):
+        self.remove_recipes(user, [recipe.id])
+
+    def add_recipes(self, user, recipe_ids):
+        self._apply_recipes(user, recipe_ids, 1)
+
+    def remove_recipes(self, user, recipe_ids):
+        self._apply_recipes(user, recipe_ids, -1)
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        """
+        Переносит правку ингредиентов рецепта в списки покупок всех
+        пользователей, у которых рецепт лежит в корзине.
+        old_amounts и new_amounts: {ingredient_id: amount}.
+        """
+        changes = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in {*old_amounts, *new_amounts}
+        }
+        changes = {key: value for key, value in changes.items() if value}
+        if not changes:
+            return
+        users = Cart.objects.filter(recipe=recipe).values_list(
+            'user_id', flat=True)
+        self.apply_deltas({
+            (user_id, ingredient_id): delta
+            for user_id in users
+            for ingredient_id, delta in changes.items()
+        })
+
+    def _apply_recipes(self, user, recipe_ids, sign):
+        amounts = RecipeIngredient.objects.filter(
+            recipe__in=recipe_ids
+        ).values_list('ingredient_id').annotate(
+            amount=models.Sum('amount')
+        ).order_by()
+        self.apply_deltas({
+            (user.id, ingredient_id): sign * amount
+            for ingredient_id, amount in amounts
+        })
+
+    @transaction.atomic
+    def apply_deltas(self, deltas):
+        """ deltas: {(user_id, ingredient_id): изменение количества}. """
+        if not deltas:
+            return
+        user_ids = {user_id for user_id, _ in deltas}
+        ingredient_ids = {ingredient_id for _, ingredient_id in deltas}
+        # Блокируем пользователей, чтобы параллельные изменения одной
+        # корзины не создали дублирующие строки агрегата.
+        list(User.objects.select_for_update().filter(
+            id__in=user_ids).values_list('id'))
+        items = {
+            (item.user_id, item.ingredient_id): item
+            for item in self.select_for_update().filter(
+                user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        }
+        to_create, to_update, to_delete = [], [], []
+        for (user_id, ingredient_id), delta in deltas.items():
+            item = items.get((user_id, ingredient_id))
+            if item is None:
+                if delta > 0:
+                    to_create.append(self.model(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total=delta))
+                continue
+            item.total += delta
+            if item.total > 0:
+                to_update.append(item)
+            else:
+                to_delete.append(item.id)
+        self.bulk_create(to_create)
+        self.bulk_update(to_update, ['total'])
+        self.filter(id__in=to_delete).delete()
+
+    def live_totals(self, user_ids=None):
+        """ Агрегат, посчитанный заново по корзинам и рецептам. """
+        queryset = RecipeIngredient.objects.filter(recipe__cart__isnull=False)
+        if user_ids is not None:
+            queryset = queryset.filter(recipe__cart__user__in=user_ids)
+        rows = queryset.values_list(
+            'recipe__cart__user', 'ingredient'
+        ).annotate(total=models.Sum('amount')).order_by()
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows
+        }
+
+    @transaction.atomic
+    def rebuild(self, user_ids=None, batch_size=1000):
+        stale = self.all()
+        if user_ids is not None:
+            stale = stale.filter(user__in=user_ids)
+        stale.delete()
+        self.bulk_create(
+            (
+                self.model(
+                    user_id=user_id, ingredient_id=ingredient_id, total=total)
+                for (user_id, ingredient_id), total
+                in self.live_totals(user_ids).items()
+            ),
+            batch_size=batch_size
+        )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient,
+        related_name='shopping_list',
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент')
+    total = models.PositiveIntegerField('Общее количество')
+
+    objects = ShoppingListManager()
+
+    class Meta:
+        ordering = ['user']
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок (агрегат)'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.ingredient}, {self.total}'
+
+
+class TrendingManager(models.Manager):
+    """
+    Пересчитывает таблицу TrendingScore.
+
+    Оценка рецепта — сумма весов добавлений в избранное и в корзину за
+    последние TRENDING_DAYS дней, каждое с затуханием вдвое за
+    TRENDING_HALF_LIFE_HOURS. Затухание экспоненциальное, поэтому при
+    очередном запуске старые оценки достаточно умножить на общий
+    множитель и учесть только добавления с прошлого запуска и добавления,
+    вышедшие за окно.
+    """
+    # Оценки меньше этой удаляются, чтобы таблица не росла.
+    min_score = 1e-3
+
+    def get_events(self):
+        return ((Favorite, 1.0), (Cart, 0.5))
+
+    def decay(self, age):
+        half_life = settings.TRENDING_HALF_LIFE_HOURS * 3600
+        return 0.5 ** (age.total_seconds() / half_life)
+
+    def contributions(self, since, until, now):
+        """ {recipe_id: вклад добавлений с since (искл.) по until}. """
+        scores = {}
+        for model, weight in self.get_events():
+            rows = model.objects.filter(
+                created__gt=since, created__lte=until
+            ).values_list('recipe_id', 'created').iterator()
+            for recipe_id, created in rows:
+                scores[recipe_id] = (
+                    scores.get(recipe_id, 0)
+                    + weight * self.decay(now - created)
+                )
+        return scores
+
+    @transaction.atomic
+    def refresh(self, full=False, now=None):
+        """ Обновляет оценки; возвращает число рецептов в таблице. """
+        now = now or timezone.now()
+        window = timedelta(days=settings.TRENDING_DAYS)
+        last = self.aggregate(last=models.Max('computed_at'))['last']
+        if full or last is None or now - last >= window:
+            self.all().delete()
+            scores = self.contributions(now - window, now, now)
+            self.bulk_create(
+                self.model(recipe_id=recipe_id, score=score, computed_at=now)
+                for recipe_id, score in scores.items()
+                if score >= self.min_score
+            )
+            return self.count()
+        self.update(
+            score=models.F('score') * self.decay(now - last),
+            computed_at=now)
+        deltas = self.contributions(last, now, now)
+        for recipe_id, score in self.contributions(
+                last - window, now - window, now).items():
+            deltas[recipe_id] = deltas.get(recipe_id, 0) - score
+        rows = self.in_bulk(deltas)
+        for recipe_id, delta in deltas.items():
+            if recipe_id in rows:
+                rows[recipe_id].score += delta
+        self.bulk_update(rows.values(), ['score'])
+        self.bulk_create(
+            self.model(recipe_id=recipe_id, score=delta, computed_at=now)
+            for recipe_id, delta in deltas.items()
+            if recipe_id not in rows and delta >= self.min_score
+        )
+        self.filter(score__lt=self.min_score).delete()
+        return self.count()
+
+
+class TrendingScore(models.Model):
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='trending',
+        on_delete=models.CASCADE,
+        verbose_name='Рецепт')
+    score = models.FloatField('Оценка')
+    computed_at = models.DateTimeField('Пересчитано')
+
+    objects = TrendingManager()
+
+    class Meta:
+        verbose_name = 'Оценка популярности'
+        verbose_name_plural = 'Оценки популярности'
+        indexes = (
+            models.Index(
+                fields=('-score', '-recipe'),
+                name='trending_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score:.3f}'
@@ -0,0 +1,98 @@
+"""
+Полнотекстовый поиск рецептов по названию и описанию.
+
+PostgreSQL: генерируемый столбец recipes_recipe.search_vector (название
+с весом A, описание с весом B, конфигурация russian) и GIN-индекс по нему;
+база сама пересчитывает столбец при каждом сохранении рецепта.
+
+SQLite (локальная разработка): таблица FTS5 recipes_recipe_fts, которую
+обновляют сигналы сохранения и удаления рецепта.
+
+Обе таблицы создаёт миграция 0014_recipe_search.
+"""
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Во сколько раз совпадение в названии важнее совпадения в описании.
+FTS_WEIGHTS = (10.0, 1.0)
+WORD = re.compile(r'\w+')
+
+
+def fts_query(text):
+    """ Запрос FTS5: все слова по префиксу, без спецсимволов FTS. """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(text))
+
+
+def search_recipes(queryset, text):
+    """
+    Оставляет рецепты, подходящие под запрос text, и добавляет аннотацию
+    search_rank (чем больше, тем выше рецепт в выдаче).
+    """
+    connection = connections[queryset.db]
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                                    SearchVectorField)
+
+        query = SearchQuery(
+            text, config=SEARCH_CONFIG, search_type='websearch')
+        vector = RawSQL(
+            f'{table}.search_vector', [], output_field=SearchVectorField())
+        return queryset.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(vector, query)
+        ).filter(search_vector=query)
+    query = fts_query(text)
+    if not query:
+        # Аннотация нужна и пустой выдаче: по search_rank её сортируют.
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    matches = RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (query,))
+    # bm25() тем меньше, чем лучше совпадение, поэтому знак меняется.
+    rank = RawSQL(
+        f'SELECT -bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+        (query,), output_field=FloatField())
+    return queryset.filter(id__in=matches).annotate(search_rank=rank)
+
+
+def index_recipe(recipe, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,))
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            (recipe.pk, recipe.name, recipe.text))
+
+
+def unindex_recipe(recipe, using='default'):
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', (recipe.pk,))
+
+
+def reindex_recipes(using='default'):
+    """ Перестраивает индекс FTS5 целиком, например после bulk_create. """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            'SELECT id, name, text FROM recipes_recipe')
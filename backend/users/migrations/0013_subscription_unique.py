@@ -0,0 +1,26 @@
+# Generated by Django 3.2.16 on 2026-10-18 04:06
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remove_duplicates(apps, schema_editor):
+    subscription = apps.get_model('users', 'Subscription')
+    keep = subscription.objects.values(
+        'follower', 'author').annotate(first=Min('id')).values('first')
+    subscription.objects.exclude(id__in=keep).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_alter_user_username'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='subscription',
+            constraint=models.UniqueConstraint(fields=('follower', 'author'), name='unique_subscription'),
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import RegexValidator
 from django.db import models
-from django.db.models import CheckConstraint, F, Q
+from django.db.models import CheckConstraint, F, Q, UniqueConstraint
 
 
 class User(AbstractUser):
@@ -27,6 +27,14 @@ class User(AbstractUser):
                                 max_length=150,
                                 blank=False,
                                 )
+    recipes_count = models.PositiveIntegerField('Рецептов',
+                                                default=0,
+                                                editable=False,
+                                                )
+    followers_count = models.PositiveIntegerField('Подписчиков',
+                                                  default=0,
+                                                  editable=False,
+                                                  )
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name', 'password']
     USERNAME_FIELD = 'email'
 
@@ -58,5 +66,7 @@ class Subscription(models.Model):
         verbose_name_plural = 'Подписки'
         constraints = [
             CheckConstraint(check=~Q(follower=F('author')),
-                            name='no_self_subscribe')
+                            name='no_self_subscribe'),
+            UniqueConstraint(fields=('follower', 'author'),
+                             name='unique_subscription')
         ]